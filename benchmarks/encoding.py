@@ -0,0 +1,41 @@
+"""Compare encode time and output size of every video encoding profile.
+
+Usage:
+    python benchmarks/encoding.py audio.mp3 background.png subtitles.srt
+"""
+import os
+import sys
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from create_captioned_videos import ENCODING_PROFILES, encode_video
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("audio", help="Mixed sermon audio")
+    parser.add_argument("background", help="Background image")
+    parser.add_argument("srt", help="Subtitle file to burn in")
+    parser.add_argument("--profiles", nargs="+", default=sorted(ENCODING_PROFILES),
+                        choices=sorted(ENCODING_PROFILES), help="Profiles to compare")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for name in args.profiles:
+            output_path = os.path.join(out_dir, f"{name}.mp4")
+            result, elapsed = encode_video(args.background, args.audio, args.srt, output_path, name)
+            if result.returncode != 0:
+                print(f"Profile {name} failed:\n{result.stderr}")
+                continue
+            rows.append((name, elapsed, os.path.getsize(output_path) / (1024 * 1024)))
+
+    print(f"\n{'profile':>10} {'fps':>4} {'preset':>10} {'crf':>4} {'seconds':>9} {'size MB':>8}")
+    for name, elapsed, size_mb in rows:
+        profile = ENCODING_PROFILES[name]
+        print(f"{name:>10} {profile['fps']:>4} {profile['preset']:>10} {profile['crf']:>4} "
+              f"{elapsed:>9.1f} {size_mb:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Local stand-in for the OpenAI endpoints the pipeline calls, for offline benchmarks.
+
+Serves canned sermon text from /v1/chat/completions (plain or streamed), a sine tone
+from /v1/audio/speech whose length follows the input text like real speech, and a fixed
+PNG from /v1/images/generations, each after a configurable delay. Point the pipeline
+at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 and any OPENAI_API_KEY.
+
+Usage:
+    python benchmarks/fake_openai.py --port 8765 --chat-latency 2 --tts-latency 1.5
+"""
+import json
+import time
+import zlib
+import struct
+import argparse
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SERMON_PARAGRAPH = (
+    "My beloved children, I speak to you today as I spoke to those who followed me along the shores "
+    "of Galilee. The world around you moves quickly, and your hearts are often troubled by many things. "
+    "Yet I tell you now what I told my disciples then: do not let your hearts be troubled. "
+    "Just as the shepherd leaves the ninety-nine to find the one that is lost, I seek each of you. "
+    "Consider the lilies of the field, how they grow; they neither toil nor spin. "
+    "Walk with me in humility, love one another as I have loved you, and you will find rest for your souls."
+)
+IMAGE_SIZE = (1792, 1024)
+SPEECH_CHARS_PER_SECOND = 14  # Roughly the pace of the slowed-down TTS voice
+
+def sermon_text(words):
+    """Canned sermon of about the given number of words, in paragraphs."""
+    paragraph_words = len(SERMON_PARAGRAPH.split())
+    return "\n\n".join([SERMON_PARAGRAPH] * max(1, round(words / paragraph_words)))
+
+def solid_png(size, rgb=(212, 175, 55)):
+    """A solid-colour PNG, built without any imaging library."""
+    width, height = size
+    row = b"\x00" + bytes(rgb) * width
+    raw = zlib.compress(row * height, 9)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", raw) + chunk(b"IEND", b"")
+
+class FakeOpenAI:
+    """Responses and latencies shared by every request handler."""
+
+    def __init__(self, chat_latency=0.0, tts_latency=0.0, image_latency=0.0, token_delay=0.0, words=1150):
+        self.chat_latency = chat_latency
+        self.tts_latency = tts_latency
+        self.image_latency = image_latency
+        self.token_delay = token_delay
+        self.sermon = sermon_text(words)
+        self.png = solid_png(IMAGE_SIZE)
+        self.requests = {"chat": 0, "speech": 0, "image": 0}
+        self._speech = {}
+        self._lock = threading.Lock()
+
+    def count(self, kind):
+        with self._lock:
+            self.requests[kind] += 1
+
+    def speech(self, text):
+        """MP3 sine tone as long as the text would take to read, cached per length."""
+        seconds = max(1.0, round(len(text) / SPEECH_CHARS_PER_SECOND, 1))
+        with self._lock:
+            audio = self._speech.get(seconds)
+        if audio is None:
+            audio = subprocess.run(
+                ["ffmpeg", "-v", "error", "-f", "lavfi", "-i", f"sine=frequency=220:duration={seconds}",
+                 "-ac", "1", "-b:a", "64k", "-f", "mp3", "pipe:1"],
+                capture_output=True, check=True
+            ).stdout
+            with self._lock:
+                self._speech[seconds] = audio
+        return audio
+
+def _usage(prompt_chars, completion_text):
+    prompt_tokens = prompt_chars // 4
+    completion_tokens = len(completion_text) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _send(self, status, content_type, payload):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _json(self, data, status=200):
+            self._send(status, "application/json", json.dumps(data).encode("utf-8"))
+
+        def do_GET(self):
+            if self.path.endswith("/files/background.png"):
+                self._send(200, "image/png", fake.png)
+            else:
+                self._json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+
+        def do_POST(self):
+            request = self._body()
+            if self.path.endswith("/chat/completions"):
+                self._chat(request)
+            elif self.path.endswith("/audio/speech"):
+                fake.count("speech")
+                time.sleep(fake.tts_latency)
+                self._send(200, "audio/mpeg", fake.speech(request.get("input", "")))
+            elif self.path.endswith("/images/generations"):
+                fake.count("image")
+                time.sleep(fake.image_latency)
+                host = self.headers.get("Host")
+                self._json({"created": int(time.time()), "data": [
+                    {"url": f"http://{host}/files/background.png", "revised_prompt": request.get("prompt")}
+                ]})
+            else:
+                self._json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+
+        def _chat(self, request):
+            fake.count("chat")
+            time.sleep(fake.chat_latency)
+            prompt_chars = sum(len(m.get("content") or "") for m in request.get("messages", []))
+            text = fake.sermon
+            base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": request.get("model")}
+            if not request.get("stream"):
+                self._json(dict(base, object="chat.completion", choices=[
+                    {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+                ], usage=_usage(prompt_chars, text)))
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            chunk = dict(base, object="chat.completion.chunk")
+            try:
+                for piece in text.split(" "):
+                    self._event(dict(chunk, choices=[{"index": 0, "delta": {"content": piece + " "},
+                                                      "finish_reason": None}]))
+                    if fake.token_delay:
+                        time.sleep(fake.token_delay)
+                self._event(dict(chunk, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+                if (request.get("stream_options") or {}).get("include_usage"):
+                    self._event(dict(chunk, choices=[], usage=_usage(prompt_chars, text)))
+                self.wfile.write(b"data: [DONE]\n\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stops reading once it has enough words
+                pass
+            self.close_connection = True
+
+        def _event(self, data):
+            self.wfile.write(b"data: " + json.dumps(data).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+
+    return Handler
+
+def start_server(port=0, **options):
+    """Serve a FakeOpenAI in a background thread. Returns (server, fake, base_url)."""
+    fake = FakeOpenAI(**options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, fake, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--chat-latency", type=float, default=0.0, help="Seconds before a chat reply starts")
+    parser.add_argument("--tts-latency", type=float, default=0.0, help="Seconds per speech request")
+    parser.add_argument("--image-latency", type=float, default=0.0, help="Seconds per image request")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed words")
+    parser.add_argument("--words", type=int, default=1150, help="Length of the canned sermon")
+    args = parser.parse_args()
+
+    server, _, base_url = start_server(
+        args.port, chat_latency=args.chat_latency, tts_latency=args.tts_latency,
+        image_latency=args.image_latency, token_delay=args.token_delay, words=args.words
+    )
+    print(f"Fake OpenAI API listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""Benchmark the full workflow and each stage in isolation against a fake OpenAI server.
+
+Each scenario runs in a fresh scratch directory with the API replaced by
+benchmarks/fake_openai.py, so results reflect our own code, FFmpeg and the configured
+API latencies. Reports sermons/hour, per-stage p50/p95 latency and peak memory, and
+writes them to a JSON file that can be compared with a run from another commit.
+
+Usage:
+    python benchmarks/pipeline.py --backlog 1 4 --workers 4
+    python benchmarks/pipeline.py --compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+
+from fake_openai import start_server, sermon_text
+
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+MUSIC_SECONDS = 60
+
+def _git_commit():
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True)
+    return result.stdout.strip() or "unknown"
+
+def _peak_child_rss_mb():
+    # Largest reaped subprocess so far (render workers and FFmpeg); scenarios run in their
+    # own process, so this and ru_maxrss only cover the current one
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024 if resource else None
+
+def _latency_stats(values):
+    from instrumentation import percentile
+    return {"runs": len(values), "mean_s": sum(values) / len(values) if values else 0.0,
+            "p50_s": percentile(values, 50), "p95_s": percentile(values, 95)}
+
+def _scratch_dir(keep):
+    """Fresh working directory with the music bed the mix stage expects."""
+    workdir = tempfile.mkdtemp(prefix="sermon-bench-")
+    os.chdir(workdir)
+    from audio_utils import DEFAULT_BACKGROUND_MUSIC
+    os.makedirs(os.path.dirname(DEFAULT_BACKGROUND_MUSIC), exist_ok=True)
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-y", "-f", "lavfi", "-i", f"anoisesrc=color=pink:duration={MUSIC_SECONDS}",
+         "-b:a", "128k", DEFAULT_BACKGROUND_MUSIC],
+        check=True
+    )
+    if not keep:
+        import atexit
+        atexit.register(shutil.rmtree, workdir, True)
+    return workdir
+
+def run_workflow(backlog, args):
+    """Generate and render `backlog` sermons through main(). Returns the scenario's metrics."""
+    import main as pipeline
+    from instrumentation import METRICS_DIR, load_events, summarize_events
+
+    workdir = _scratch_dir(args.keep)
+    argv = ["--generate", str(backlog), "--workers", str(args.workers), "--profile", args.profile]
+    started = time.perf_counter()
+    pipeline.main(argv)
+    elapsed = time.perf_counter() - started
+
+    videos = [name for name in os.listdir("videos") if name.endswith(".mp4")] if os.path.isdir("videos") else []
+    events = []
+    for name in os.listdir(METRICS_DIR):
+        events += load_events(os.path.join(METRICS_DIR, name))
+    stages = summarize_events(events)
+    return {
+        "backlog": backlog,
+        "videos": len(videos),
+        "wall_s": elapsed,
+        "sermons_per_hour": len(videos) / elapsed * 3600 if elapsed else 0.0,
+        "peak_rss_mb": max((e.get("peak_rss_mb", 0) for e in events), default=0),
+        "peak_child_rss_mb": _peak_child_rss_mb(),
+        "stages": {
+            stage: {"runs": s["count"], "failed": s["failed"], "p50_s": s["p50_s"], "p95_s": s["p95_s"]}
+            for stage, s in stages.items()
+        },
+        "workdir": workdir if args.keep else None,
+    }
+
+def run_workflow_isolated(backlog, args):
+    """Run one workflow scenario in a fresh process, so its peak memory is its own.
+
+    ru_maxrss is a lifetime maximum, so in-process scenarios would report the peaks of
+    the ones before them. The child inherits the fake API settings from the environment.
+    """
+    fd, result_path = tempfile.mkstemp(prefix="sermon-bench-", suffix=".json")
+    os.close(fd)
+    try:
+        command = [sys.executable, os.path.abspath(__file__), "--scenario", str(backlog),
+                   "--scenario-output", result_path, "--workers", str(args.workers), "--profile", args.profile]
+        command += ["--keep"] if args.keep else []
+        command += ["--verbose"] if args.verbose else []
+        subprocess.run(command, check=True)
+        with open(result_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.remove(result_path)
+
+def _timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+def run_stages(args):
+    """Run each stage on its own, args.repeat times. Returns {stage: latency stats}."""
+    from sermon_generator import generate_sermon
+    from audio_utils import text_to_audio, mix_audio, TTS_MAX_IN_FLIGHT, DEFAULT_BACKGROUND_MUSIC
+    from music_bed import prepare_music_bed
+    from create_captioned_videos import generate_background_image, create_video_with_subtitles
+
+    _scratch_dir(args.keep)
+    # Prepare the music bed untimed, as main() does before rendering; "mix" then only reads it
+    prepare_music_bed(DEFAULT_BACKGROUND_MUSIC)
+    text = sermon_text(args.words)
+    timings = {}
+
+    def record(stage, func, *func_args, **func_kwargs):
+        result, elapsed = _timed(func, *func_args, **func_kwargs)
+        if not result:
+            raise RuntimeError(f"Stage {stage} failed")
+        timings.setdefault(stage, []).append(elapsed)
+        return result
+
+    for run in range(args.repeat):
+        workdir = os.path.abspath(f"stage_run_{run}")
+        os.makedirs(workdir, exist_ok=True)
+        voice_path = os.path.join(workdir, "voice.mp3")
+        mixed_path = os.path.join(workdir, "mixed.mp3")
+        timing_path = os.path.join(workdir, "chunk_timings.json")
+
+        record("sermon", generate_sermon)
+        # Serial synthesis is the pre-concurrency baseline for the TTS stage
+        record("tts_serial", text_to_audio, text, voice_path, workdir=workdir, max_in_flight=1, use_cache=False)
+        record(f"tts_{TTS_MAX_IN_FLIGHT}_in_flight", text_to_audio, text, voice_path, workdir=workdir,
+               max_in_flight=TTS_MAX_IN_FLIGHT, use_cache=False, timing_path=timing_path)
+        if run == 0:
+            # Fill the TTS cache (untimed) so the next call measures a fully cached sermon
+            text_to_audio(text, voice_path, workdir=workdir, use_cache=True)
+        record("tts_cached", text_to_audio, text, voice_path, workdir=workdir, use_cache=True)
+        background_path = record("image", generate_background_image, f"bench_{run}")
+        record("mix", mix_audio, voice_path, mixed_path)
+        record(f"render_{args.profile}", create_video_with_subtitles, mixed_path,
+               os.path.join(workdir, "video.mp4"), use_generated_bg=False, background_path=background_path,
+               workdir=workdir, subtitle_mode="text", timing_path=timing_path, encoding_profile=args.profile)
+        if args.whisper:
+            record("render_whisper", create_video_with_subtitles, mixed_path,
+                   os.path.join(workdir, "video_whisper.mp4"), use_generated_bg=False,
+                   background_path=background_path, workdir=None, subtitle_mode="whisper",
+                   encoding_profile=args.profile)
+
+    return {stage: _latency_stats(values) for stage, values in timings.items()}
+
+def print_results(results):
+    for scenario in results["workflow"]:
+        print(f"\nWorkflow, backlog {scenario['backlog']}: {scenario['videos']} videos in "
+              f"{scenario['wall_s']:.1f}s = {scenario['sermons_per_hour']:.1f} sermons/hour, "
+              f"peak RSS {scenario['peak_rss_mb']:.0f} MB (subprocesses {scenario['peak_child_rss_mb'] or 0:.0f} MB)")
+        print(f"{'stage':<16} {'runs':>5} {'fail':>5} {'p50 s':>8} {'p95 s':>8}")
+        for stage, s in scenario["stages"].items():
+            print(f"{stage:<16} {s['runs']:>5} {s['failed']:>5} {s['p50_s']:>8.2f} {s['p95_s']:>8.2f}")
+
+    if results["stages"]:
+        print(f"\nStages in isolation ({results['config']['repeat']} runs each)")
+        print(f"{'stage':<20} {'mean s':>8} {'p50 s':>8} {'p95 s':>8}")
+        for stage, s in results["stages"].items():
+            print(f"{stage:<20} {s['mean_s']:>8.2f} {s['p50_s']:>8.2f} {s['p95_s']:>8.2f}")
+
+def _flatten(results):
+    """Comparable metrics of a results file as {name: (value, higher_is_better)}."""
+    metrics = {}
+    for scenario in results["workflow"]:
+        prefix = f"workflow[{scenario['backlog']}]"
+        metrics[f"{prefix} sermons/hour"] = (scenario["sermons_per_hour"], True)
+        metrics[f"{prefix} peak RSS MB"] = (scenario["peak_rss_mb"], False)
+        for stage, s in scenario["stages"].items():
+            metrics[f"{prefix} {stage} p50 s"] = (s["p50_s"], False)
+            metrics[f"{prefix} {stage} p95 s"] = (s["p95_s"], False)
+    for stage, s in results["stages"].items():
+        metrics[f"{stage} p50 s"] = (s["p50_s"], False)
+        metrics[f"{stage} p95 s"] = (s["p95_s"], False)
+    return metrics
+
+def compare(old_path, new_path):
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    old_metrics, new_metrics = _flatten(old), _flatten(new)
+    print(f"{'metric':<44} {old['commit']:>10} {new['commit']:>10} {'change':>9}")
+    for name, (new_value, higher_is_better) in new_metrics.items():
+        if name not in old_metrics:
+            continue
+        old_value = old_metrics[name][0]
+        change = (new_value - old_value) / old_value if old_value else 0.0
+        better = change > 0 if higher_is_better else change < 0
+        marker = "" if abs(change) < 0.05 else (" better" if better else " WORSE")
+        print(f"{name:<44} {old_value:>10.2f} {new_value:>10.2f} {change:>+8.1%}{marker}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backlog", type=int, nargs="*", default=[1, 3],
+                        help="Backlog sizes to run the full workflow with")
+    parser.add_argument("--workers", type=int, default=2, help="Passed to main.py --workers")
+    parser.add_argument("--profile", default="fast", help="Encoding profile")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each isolated stage (0 to skip)")
+    parser.add_argument("--whisper", action="store_true", help="Also time a Whisper-captioned render")
+    parser.add_argument("--chat-latency", type=float, default=1.0)
+    parser.add_argument("--tts-latency", type=float, default=1.0)
+    parser.add_argument("--image-latency", type=float, default=2.0)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--words", type=int, default=1150, help="Length of the canned sermon")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<date>_<commit>.json)")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directories")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's logging")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two results files and exit")
+    # Internal: run a single workflow scenario (see run_workflow_isolated)
+    parser.add_argument("--scenario", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--scenario-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.scenario is not None:
+        import main as pipeline  # noqa: F401  (configures logging)
+        if not args.verbose:
+            logging.getLogger().setLevel(logging.WARNING)
+        result = run_workflow(args.scenario, args)
+        with open(args.scenario_output, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        return
+    if not shutil.which("ffmpeg"):
+        sys.exit("ffmpeg is required")
+
+    server, fake, base_url = start_server(
+        chat_latency=args.chat_latency, tts_latency=args.tts_latency,
+        image_latency=args.image_latency, token_delay=args.token_delay, words=args.words
+    )
+    # Set before the pipeline is imported; worker processes inherit it
+    os.environ.update({"OPENAI_BASE_URL": base_url, "OPENAI_API_KEY": "fake", "OPENAI_CACHE_MODE": "live"})
+    output = os.path.abspath(args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{_git_commit()}.json"
+    ))
+
+    import main as pipeline  # noqa: F401  (configures logging)
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    results = {
+        "commit": _git_commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("compare", "output", "keep", "verbose")},
+        "workflow": [run_workflow_isolated(backlog, args) for backlog in args.backlog],
+        "stages": run_stages(args) if args.repeat else {},
+    }
+    results["fake_api_requests"] = dict(fake.requests)
+    server.shutdown()
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print_results(results)
+    print(f"\nResults written to {output}")
+
+if __name__ == "__main__":
+    main()
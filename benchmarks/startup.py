@@ -0,0 +1,86 @@
+"""Measure how long importing the pipeline takes, and fail if heavy dependencies load eagerly.
+
+Runs `python -X importtime` on each entry module in a fresh interpreter and reports
+the slowest imports. Whisper/torch, numpy, PIL, requests and the OpenAI SDK must only
+be imported when a stage first needs them, so a run with nothing to do starts fast.
+
+Usage:
+    python benchmarks/startup.py --budget-ms 500
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+ENTRY_MODULES = ("main", "sermon_generator", "create_captioned_videos")
+# Top-level packages that must not be imported at startup
+LAZY_PACKAGES = ("whisper", "torch", "numpy", "PIL", "requests", "openai", "httpx")
+
+def import_profile(module):
+    """Import module in a fresh interpreter.
+
+    Returns (wall seconds, {package: cumulative us} for everything imported,
+    {package: cumulative us} for the modules the entry module imports directly).
+    """
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC_DIR, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        sys.exit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    cumulative = {}
+    direct = {}
+    children = {}  # Depth-1 imports since the last depth-0 one; they belong to the next
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        # The name is preceded by one space, plus two per level of nesting
+        # A module's own imports are listed before it, one level deeper
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        cumulative[name] = int(cumulative_us)
+        if depth == 1:
+            children[name] = int(cumulative_us)
+        elif depth == 0:
+            if name == module:
+                direct = children
+            children = {}
+    return elapsed, cumulative, direct
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=500,
+                        help="Fail if importing an entry module takes longer than this")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    args = parser.parse_args()
+
+    failures = []
+    for module in ENTRY_MODULES:
+        elapsed, cumulative, direct = import_profile(module)
+        print(f"\n{module}: {elapsed * 1000:.0f} ms (interpreter start included), "
+              f"{cumulative.get(module, 0) / 1000:.0f} ms importing the module")
+        print(f"{'cumulative ms':>14}  module imported by {module}")
+        for name, us in sorted(direct.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"{us / 1000:>14.1f}  {name}")
+
+        eager = sorted({name.split(".")[0] for name in cumulative} & set(LAZY_PACKAGES))
+        if eager:
+            failures.append(f"{module} imports {', '.join(eager)} at startup")
+        if elapsed * 1000 > args.budget_ms:
+            failures.append(f"{module} took {elapsed * 1000:.0f} ms to import (budget {args.budget_ms:.0f} ms)")
+
+    if failures:
+        print("\n" + "\n".join(f"FAIL: {failure}" for failure in failures))
+        sys.exit(1)
+    print("\nOK: no heavy imports at startup")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Compare single-process and sharded Whisper transcription on one audio file.
+
+Usage:
+    python benchmarks/transcription.py processed_audio/sermon.mp3 --shards 2 4 8
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from create_captioned_videos import get_whisper_model, transcribe_audio, warm_shard_pool
+
+def _word_overlap(reference, candidate):
+    """Share of the reference words that also appear in the candidate transcript."""
+    reference_words = " ".join(s["text"] for s in reference).lower().split()
+    candidate_words = set(" ".join(s["text"] for s in candidate).lower().split())
+    if not reference_words:
+        return 1.0
+    return sum(word in candidate_words for word in reference_words) / len(reference_words)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("audio", help="Audio file to transcribe")
+    parser.add_argument("--shards", type=int, nargs="+", default=[2, 4],
+                        help="Shard counts to compare against one process")
+    parser.add_argument("--model", default=None, help="Whisper model size")
+    args = parser.parse_args()
+
+    # Load the model up front so the baseline doesn't pay for it
+    get_whisper_model(args.model)
+
+    started = time.perf_counter()
+    baseline = transcribe_audio(args.audio, args.model, shards=1)
+    baseline_time = time.perf_counter() - started
+    if baseline is None:
+        sys.exit("Baseline transcription failed")
+
+    rows = [("1 (current)", baseline_time, 1.0, len(baseline), 1.0)]
+    for shards in args.shards:
+        # Start the shard workers first, as a long-running pipeline keeps them loaded
+        warm_shard_pool(args.model, shards)
+        started = time.perf_counter()
+        segments = transcribe_audio(args.audio, args.model, shards=shards)
+        elapsed = time.perf_counter() - started
+        if segments is None:
+            print(f"Sharded transcription with {shards} shards failed")
+            continue
+        rows.append((str(shards), elapsed, baseline_time / elapsed, len(segments), _word_overlap(baseline, segments)))
+
+    print(f"\n{'shards':>12} {'seconds':>9} {'speedup':>8} {'segments':>9} {'word overlap':>13}")
+    for shards, elapsed, speedup, count, overlap in rows:
+        print(f"{shards:>12} {elapsed:>9.1f} {speedup:>7.2f}x {count:>9} {overlap:>12.1%}")
+
+if __name__ == "__main__":
+    main()
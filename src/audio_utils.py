@@ -2,42 +2,190 @@
 import os
 import shutil
 import logging
-import subprocess
-from openai import OpenAI
+import json
+import random
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from text_chunker import iter_text_chunks
+from tts_cache import tts_cache_key, fetch_cached_audio, store_cached_audio, get_tts_cache_stats
+from openai_client import get_client
+from instrumentation import measure, get_file_size
+from ffmpeg_runner import run_ffmpeg, probe_duration
+from music_bed import DEFAULT_BACKGROUND_MUSIC, prepare_music_bed
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-def text_to_audio(text, output_path):
-    """Convert text to audio using OpenAI's text-to-speech."""
+# Text-to-speech settings
+TTS_MODEL = "gpt-4o-mini-tts"
+TTS_VOICE = "ash"  # Using a deep, authoritative voice
+TTS_SPEED = 0.78
+TTS_INSTRUCTIONS = "Speak in a slow and reverent tone, as if you are reading from a sacred text."
+TTS_CHUNK_SIZE = 4000  # Max characters per request (leaving some buffer under the 4096 API limit)
+
+# Concurrency and retry policy for chunk synthesis
+TTS_MAX_IN_FLIGHT = 4
+TTS_MAX_RETRIES = 5
+TTS_RETRY_BASE_DELAY = 1.0  # Seconds, doubled on every attempt
+
+def _retry_delay(error, attempt):
+    """Seconds to wait before retrying a failed TTS request, or None if it shouldn't be retried."""
+    from openai import APIConnectionError, APIStatusError
+    if isinstance(error, APIStatusError):
+        if error.status_code != 429 and error.status_code < 500:
+            return None
+        # Honour the server's hint when it gives one
+        retry_after = error.response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+    elif not isinstance(error, APIConnectionError):
+        return None
+    return TTS_RETRY_BASE_DELAY * (2 ** attempt) * random.uniform(0.5, 1.0)
+
+def synthesize_chunk(client, chunk, output_file, index=0, total=None, use_cache=True):
+    """Synthesize one text chunk into output_file, retrying on 429/5xx and connection errors.
+
+    Identical chunks (same text, model, voice, speed and instructions) are served
+    from the on-disk TTS cache instead of the API.
+    """
+    label = f"{index+1} of {total}" if total else f"{index+1}"
+    with measure("tts_chunk", chars=len(chunk), chunk=index) as event:
+        key = tts_cache_key(chunk, TTS_MODEL, TTS_VOICE, TTS_SPEED, TTS_INSTRUCTIONS)
+        if use_cache and fetch_cached_audio(key, output_file):
+            logger.info(f"Reused cached audio chunk {label}")
+            event["cached"] = True
+            event["bytes_out"] = get_file_size(output_file)
+            return output_file
+
+        for attempt in range(TTS_MAX_RETRIES + 1):
+            started = time.monotonic()
+            try:
+                response = client.audio.speech.create(
+                    model=TTS_MODEL,
+                    voice=TTS_VOICE,
+                    speed=TTS_SPEED,
+                    instructions=TTS_INSTRUCTIONS,
+                    input=chunk
+                )
+            except Exception as e:
+                delay = _retry_delay(e, attempt) if attempt < TTS_MAX_RETRIES else None
+                if delay is None:
+                    raise
+                logger.warning(f"Audio chunk {label} failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            # Save the chunk
+            with open(output_file, 'wb') as f:
+                f.write(response.content)
+            logger.info(f"Created audio chunk {label} in {time.monotonic() - started:.2f}s")
+            event["cached"] = False
+            event["attempts"] = attempt + 1
+            event["bytes_out"] = len(response.content)
+            if use_cache:
+                store_cached_audio(key, output_file)
+            return output_file
+
+def get_audio_duration(audio_path):
+    """Return the duration of an audio file in seconds, measured with ffprobe."""
+    return probe_duration(audio_path)
+
+def write_chunk_timings(chunk_texts, chunk_files, timing_path):
+    """Record each chunk's text and audio duration so subtitles can be timed without ASR."""
+    timings = [
+        {"text": chunk_text, "duration": get_audio_duration(chunk_file)}
+        for chunk_text, chunk_file in zip(chunk_texts, chunk_files)
+    ]
+    with open(timing_path, 'w', encoding='utf-8') as f:
+        json.dump(timings, f, ensure_ascii=False, indent=2)
+    return timings
+
+def synthesize_chunks(text, workdir="temp", max_in_flight=TTS_MAX_IN_FLIGHT, use_cache=True,
+                      chunk_size=TTS_CHUNK_SIZE, timing_path=None, require_timings=False):
+    """Synthesize text into ordered chunk files in workdir.
+
+    The text is split on sentence and paragraph boundaries. Chunks are synthesized
+    concurrently, at most max_in_flight at a time. Partial chunks are removed if any
+    chunk fails.
+    Args:
+        text: The sermon text, or an iterable of text fragments (e.g. a streaming
+            completion); synthesis starts as soon as the first chunk is complete.
+        workdir (str): Scratch directory for chunk files; pass a job workspace so
+            concurrent jobs don't overwrite each other's chunks.
+        max_in_flight (int): Maximum number of concurrent TTS requests.
+        use_cache (bool): Reuse previously synthesized chunks from the TTS cache.
+        chunk_size (int): Maximum characters per TTS request.
+        timing_path (str, optional): Where to write the per-chunk text and durations
+            used to build subtitles from the script (see write_chunk_timings).
+        require_timings (bool): Fail if the timings can't be measured. Otherwise the
+            timing file is skipped with a warning and captions fall back to Whisper.
+    Returns:
+        list: Absolute chunk file paths in playback order.
+    """
+    temp_files = []
+    chunk_texts = []
     try:
-        client = OpenAI()
+        # Retries are handled per chunk with our own backoff
+        client = get_client(max_retries=0)
         
-        # Create temp directory if it doesn't exist
-        os.makedirs("temp", exist_ok=True)
+        # Create scratch directory if it doesn't exist
+        os.makedirs(workdir, exist_ok=True)
         
-        # Split text into chunks of 4000 characters (leaving some buffer)
-        chunks = [text[i:i+4000] for i in range(0, len(text), 4000)]
-        temp_files = []
+        # Synthesize chunks concurrently as the chunker produces them; results are collected in chunk order
+        started = time.monotonic()
+        futures = []
+        with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as pool:
+            try:
+                for i, chunk in enumerate(iter_text_chunks(text, chunk_size)):
+                    temp_file = os.path.abspath(os.path.join(workdir, f"chunk_{i}.mp3"))
+                    temp_files.append(temp_file)
+                    chunk_texts.append(chunk)
+                    # Run in a copy of this context so chunk events are tagged with the job
+                    futures.append(pool.submit(contextvars.copy_context().run, synthesize_chunk,
+                                               client, chunk, temp_file, i, None, use_cache))
+                for future in futures:
+                    future.result()
+            except Exception:
+                # Drop queued chunks; requests already in flight finish before the pool closes
+                for future in futures:
+                    future.cancel()
+                raise
+        if not temp_files:
+            raise ValueError("No text to synthesize")
+        logger.info(f"Synthesized {len(temp_files)} audio chunks in {time.monotonic() - started:.2f}s "
+                    f"(TTS cache: {get_tts_cache_stats()})")
         
-        # Process each chunk
-        for i, chunk in enumerate(chunks):
-            temp_file = os.path.abspath(f"temp/chunk_{i}.mp3")
-            temp_files.append(temp_file)
-            
-            # Create the speech file for this chunk
-            response = client.audio.speech.create(
-                model="gpt-4o-mini-tts",
-                voice="ash",  # Using a deep, authoritative voice
-                speed=0.78,
-                instructions="Speak in a slow and reverent tone, as if you are reading from a sacred text.",
-                input=chunk
-            )
-            
-            # Save the chunk
-            with open(temp_file, 'wb') as f:
-                f.write(response.content)
-            logger.info(f"Created audio chunk {i+1} of {len(chunks)}")
+        if timing_path:
+            try:
+                write_chunk_timings(chunk_texts, temp_files, timing_path)
+            except Exception as e:
+                if require_timings:
+                    raise
+                logger.warning(f"Could not measure chunk timings, skipping {timing_path}: {str(e)}")
+                # Don't let captions be timed from an earlier run's file
+                if os.path.exists(timing_path):
+                    os.remove(timing_path)
+        return temp_files
+    except Exception:
+        # Don't leave partial chunks behind
+        for temp_file in temp_files:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+        raise
+
+def text_to_audio(text, output_path, workdir="temp", max_in_flight=TTS_MAX_IN_FLIGHT, use_cache=True,
+                  chunk_size=TTS_CHUNK_SIZE, timing_path=None):
+    """Convert text to audio using OpenAI's text-to-speech.
+
+    Chunks are synthesized by synthesize_chunks (see there for the arguments) and
+    concatenated in their original order into output_path.
+    """
+    try:
+        temp_files = synthesize_chunks(text, workdir, max_in_flight, use_cache, chunk_size, timing_path)
         
         # If we only have one chunk, just move it to the output path
         if len(temp_files) == 1:
@@ -45,18 +193,19 @@ def text_to_audio(text, output_path):
             return True
             
         # Combine all chunks using FFmpeg
-        concat_file = os.path.abspath("temp/concat.txt")
+        concat_file = os.path.abspath(os.path.join(workdir, "concat.txt"))
         with open(concat_file, 'w') as f:
             for temp_file in temp_files:
-                f.write(f"file '{temp_file}'\n")
-        
-        # FFmpeg command to concatenate files
-        ffmpeg_cmd = (
-            f'ffmpeg -y -f concat -safe 0 -i "{concat_file}" '
-            f'-c copy "{output_path}"'
-        )
+                # The concat demuxer quotes paths; a quote inside one is written as '\''
+                escaped = temp_file.replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
         
-        result = subprocess.run(ffmpeg_cmd, shell=True, capture_output=True, text=True)
+        # Join the chunks without re-encoding
+        with measure("concat", bytes_in=get_file_size(temp_files)) as event:
+            result = run_ffmpeg(["-f", "concat", "-safe", "0", "-i", concat_file, "-c", "copy"],
+                                output_path, label="concat")
+            event["ok"] = result.returncode == 0
+            event["bytes_out"] = get_file_size(output_path)
         
         # Clean up temp files
         for temp_file in temp_files:
@@ -76,40 +225,74 @@ def text_to_audio(text, output_path):
         logger.error(f"Error creating audio file: {str(e)}")
         return False
 
-def mix_audio(voice_path, output_path, background_music=None):
-    """Mix voice audio with background music."""
+def build_mix_filter(voice_labels, music_label=None):
+    """Filter graph that joins the voice inputs in order and mixes the music under them.
+
+    Args:
+        voice_labels (list): FFmpeg stream labels of the voice inputs, e.g. ["0:a"].
+        music_label (str, optional): Stream label of a looped music bed (see music_bed),
+            which is already at its level under the voice.
+    Returns:
+        str: A filter_complex graph whose output is labelled [aout].
+    """
+    voice = ''.join(f'[{label}]' for label in voice_labels)
+    voice += f'concat=n={len(voice_labels)}:v=0:a=1,volume=1.0'
+    if not music_label:
+        return f'{voice}[aout]'
+    return (
+        f'{voice}[voice];'
+        f'[voice][{music_label}]amix=inputs=2:duration=first:normalize=0[aout]'
+    )
+
+def mix_audio(voice_path, output_path, background_music=None, fallback_to_voice=True):
+    """Mix voice audio with background music.
+
+    The track is read from its prepared, loudness-normalized bed (see prepare_music_bed),
+    looped for as long as the voice lasts.
+    Args:
+        fallback_to_voice (bool): Write the voice track alone when the music can't be
+            mixed. If False, return False instead.
+    """
     try:
         # Use provided background music or default
         if not background_music:
-            background_music = "assets/music/ambient_worship.mp3"
+            background_music = DEFAULT_BACKGROUND_MUSIC
         
-        if not os.path.exists(background_music):
-            logger.warning("Background music file not found. Using voice track only.")
+        music_bed = prepare_music_bed(background_music)
+        if not music_bed:
+            if not fallback_to_voice:
+                return False
+            logger.warning("Background music is unavailable. Using voice track only.")
             shutil.copy2(voice_path, output_path)
             return True
         
-        # Simple mix command with volume adjustment and audio normalization
-        ffmpeg_cmd = (
-            f'ffmpeg -y '
-            f'-i "{voice_path}" '
-            f'-i "{background_music}" '
-            f'-filter_complex "'
-            f'[0:a]volume=1.0[voice];'
-            f'[1:a]volume=0.1[music];'
-            f'[voice][music]amix=inputs=2:duration=first:normalize=0[aout]" '
-            f'-map "[aout]" '
-            f'-ar 44100 '
-            f'-ab 192k '
-            f'"{output_path}"'
-        )
+        # The bed is already at its level under the voice
+        ffmpeg_args = [
+            "-i", voice_path,
+            "-stream_loop", "-1", "-i", music_bed,
+            "-filter_complex", build_mix_filter(["0:a"], "1:a"),
+            "-map", "[aout]",
+            "-ar", "44100",
+            "-b:a", "192k",
+        ]
+        
+        try:
+            duration = get_audio_duration(voice_path)
+        except Exception:
+            duration = None  # Only used to report progress
         
-        result = subprocess.run(ffmpeg_cmd, shell=True, capture_output=True, text=True)
+        with measure("mix", bytes_in=get_file_size([voice_path, music_bed])) as event:
+            result = run_ffmpeg(ffmpeg_args, output_path, duration=duration, label="mix")
+            event["ok"] = result.returncode == 0
+            event["bytes_out"] = get_file_size(output_path)
         
         if result.returncode == 0:
             logger.info("Audio mixing completed successfully")
             return True
         else:
             logger.error(f"FFmpeg error during mixing: {result.stderr}")
+            if not fallback_to_voice:
+                return False
             # If mixing fails, use voice track only
             logger.warning("Falling back to voice track only")
             shutil.copy2(voice_path, output_path)
@@ -117,6 +300,8 @@ def mix_audio(voice_path, output_path, background_music=None):
             
     except Exception as e:
         logger.error(f"Error mixing audio: {str(e)}")
+        if not fallback_to_voice:
+            return False
         # If any error occurs, use voice track only
         shutil.copy2(voice_path, output_path)
         return True 
\ No newline at end of file
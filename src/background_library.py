@@ -0,0 +1,122 @@
+"""On-disk library of generated background images, reused across videos."""
+import os
+import json
+import random
+import hashlib
+import logging
+import tempfile
+import threading
+from datetime import datetime
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+LIBRARY_DIR = "backgrounds/library"
+INDEX_PATH = os.path.join(LIBRARY_DIR, "index.json")
+CLIP_DIR = os.path.join(LIBRARY_DIR, "clips")
+OUTPUT_SIZE = (1920, 1080)  # Backgrounds are stored pre-scaled to the video resolution
+
+# Generate new images until the library holds this many, then start reusing them
+LIBRARY_MIN_SIZE = int(os.getenv("BACKGROUND_LIBRARY_SIZE", "10"))
+SELECTION_POLICIES = ("least_used", "random", "new")
+
+_index_lock = threading.Lock()
+
+def load_index():
+    """Return the library index: a list of image entries."""
+    try:
+        with open(INDEX_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+def _save_index(index):
+    os.makedirs(LIBRARY_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=LIBRARY_DIR, suffix=".part")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, INDEX_PATH)
+
+def get_image_path(entry):
+    return os.path.join(LIBRARY_DIR, entry["file"])
+
+def add_background(image_path, prompt, topic=None):
+    """Scale an image to OUTPUT_SIZE once, store it in the library and index it.
+    Returns:
+        dict: The library entry for the image.
+    """
+    from PIL import Image, ImageOps
+
+    with open(image_path, "rb") as f:
+        image_id = hashlib.sha256(f.read()).hexdigest()[:16]
+
+    with Image.open(image_path) as image:
+        source_size = list(image.size)
+        # Crop to the output aspect ratio rather than letterboxing
+        scaled = ImageOps.fit(image.convert("RGB"), OUTPUT_SIZE, Image.LANCZOS)
+
+    os.makedirs(LIBRARY_DIR, exist_ok=True)
+    entry = {
+        "id": image_id,
+        "file": f"{image_id}.png",
+        "prompt": prompt,
+        "topic": topic,
+        "size": list(OUTPUT_SIZE),
+        "source_size": source_size,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "uses": 0,
+        "last_used": None,
+    }
+    scaled.save(get_image_path(entry))
+
+    with _index_lock:
+        index = [e for e in load_index() if e["id"] != image_id]
+        index.append(entry)
+        _save_index(index)
+    logger.info(f"Added background {image_id} to library ({len(index)} images)")
+    return entry
+
+def select_background(topic=None, policy="least_used"):
+    """Pick a library image for a video and record the use.
+
+    Images generated for the same topic are preferred. Returns None when a new image
+    should be generated instead: with the "new" policy, or while the library holds
+    fewer than LIBRARY_MIN_SIZE images.
+    """
+    if policy not in SELECTION_POLICIES:
+        raise ValueError(f"Unknown background selection policy: {policy}")
+
+    with _index_lock:
+        index = [e for e in load_index() if os.path.exists(get_image_path(e))]
+        if policy == "new" or len(index) < LIBRARY_MIN_SIZE:
+            return None
+
+        candidates = [e for e in index if topic and e.get("topic") == topic] or index
+        if policy == "random":
+            entry = random.choice(candidates)
+        else:
+            entry = min(candidates, key=lambda e: (e["uses"], e["last_used"] or ""))
+
+        entry["uses"] += 1
+        entry["last_used"] = datetime.now().isoformat(timespec="seconds")
+        _save_index(index)
+    return entry
+
+def record_use(entry_id):
+    """Count a use of a freshly added image."""
+    with _index_lock:
+        index = load_index()
+        for entry in index:
+            if entry["id"] == entry_id:
+                entry["uses"] += 1
+                entry["last_used"] = datetime.now().isoformat(timespec="seconds")
+        _save_index(index)
+
+def is_library_image(image_path):
+    """Whether a path points into the library (and so must not be deleted after use)."""
+    return os.path.dirname(os.path.abspath(image_path)) == os.path.abspath(LIBRARY_DIR)
+
+def get_base_clip_path(image_path, encoding_profile):
+    """Where the pre-encoded looping clip of a library image is cached for a profile."""
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(CLIP_DIR, f"{stem}_{encoding_profile}.mp4")
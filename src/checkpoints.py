@@ -0,0 +1,69 @@
+"""Stage checkpoints that let a rerun skip work whose inputs haven't changed.
+
+Each stage stores a record in its job workspace with a key derived from the stage's
+inputs and the content hash of every file it produced. A checkpoint is only reused
+when the key matches and the files are still on disk, unmodified.
+"""
+import os
+import json
+import hashlib
+import tempfile
+from datetime import datetime
+
+CHECKPOINT_DIR = "checkpoints"  # Inside the job workspace
+
+def hash_file(path, block_size=1024 * 1024):
+    """SHA-256 of a file's contents, or None if it doesn't exist."""
+    if not path or not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def stage_key(*inputs):
+    """Hash a stage's inputs (strings, numbers, file hashes...) into a checkpoint key."""
+    payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _record_path(workdir, stage):
+    return os.path.join(workdir, CHECKPOINT_DIR, f"{stage}.json")
+
+def _artifact_files(artifact):
+    return list(artifact) if isinstance(artifact, (list, tuple)) else [artifact]
+
+def load_checkpoint(workdir, stage, key):
+    """Return the stage's artifact if its checkpoint is still valid, else None."""
+    try:
+        with open(_record_path(workdir, stage), "r", encoding="utf-8") as f:
+            record = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    if record.get("key") != key:
+        return None
+    for path, digest in record["files"].items():
+        if hash_file(path) != digest:
+            return None
+    return record["artifact"]
+
+def save_checkpoint(workdir, stage, key, artifact, files=None):
+    """Record a finished stage.
+    Args:
+        artifact: Path, or list of paths, handed to the next stage.
+        files (list, optional): Every file the stage produced. Defaults to the artifact's paths.
+    """
+    files = _artifact_files(artifact) if files is None else files
+    record = {
+        "key": key,
+        "artifact": artifact,
+        "files": {path: hash_file(path) for path in files},
+        "created": datetime.now().isoformat(timespec="seconds"),
+    }
+    record_path = _record_path(workdir, stage)
+    os.makedirs(os.path.dirname(record_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(record_path), suffix=".part")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=2)
+    os.replace(tmp_path, record_path)
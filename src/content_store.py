@@ -0,0 +1,93 @@
+"""Helpers shared by the on-disk caches (TTS chunks, recorded OpenAI responses).
+
+Entries are files named after their key and sharded by its first two characters.
+Writes go through a temp file and a rename, so readers never see a partial entry, and
+the least recently used entries are evicted once a cache grows past its size limit.
+Every file whose name starts with "<key>." belongs to that key's entry.
+"""
+import os
+import shutil
+import logging
+import tempfile
+import threading
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class Counters:
+    """Thread-safe counters for a cache's hits, misses, stores and evictions."""
+
+    def __init__(self, *names):
+        self._counts = dict.fromkeys(names, 0)
+        self._lock = threading.Lock()
+
+    def add(self, name, count=1):
+        with self._lock:
+            self._counts[name] += count
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+def entry_path(cache_dir, key, suffix):
+    """Path of one of an entry's files, e.g. entry_path(dir, key, ".mp3")."""
+    return os.path.join(cache_dir, key[:2], f"{key}{suffix}")
+
+def write_entry(path, data=None, source_path=None):
+    """Atomically write bytes, or a copy of source_path, to an entry file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if source_path is None:
+                f.write(data)
+            else:
+                with open(source_path, "rb") as source:
+                    shutil.copyfileobj(source, f)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def touch_entry(*paths):
+    """Refresh the access time used for LRU eviction; raises FileNotFoundError if one is gone."""
+    for path in paths:
+        os.utime(path)
+
+def evict_lru(cache_dir, max_bytes):
+    """Delete least recently used entries, with all their files, until the cache fits in max_bytes.
+
+    Returns:
+        int: Number of entries evicted.
+    """
+    entries = {}
+    total = 0
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if name.endswith(".part"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            key = name.split(".", 1)[0]
+            mtime, size, paths = entries.get(key, (0, 0, []))
+            entries[key] = (max(mtime, stat.st_mtime), size + stat.st_size, paths + [path])
+            total += stat.st_size
+
+    if total <= max_bytes:
+        return 0
+
+    evicted = 0
+    for _, size, paths in sorted(entries.values()):
+        if total <= max_bytes:
+            break
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        total -= size
+        evicted += 1
+    return evicted
@@ -1,65 +1,92 @@
 import os
 import logging
-import whisper
-import subprocess
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import timedelta, datetime
 import glob
-import atexit
-from openai import OpenAI
-import requests
-from PIL import Image
+import shutil
+import time
 import io
-import openai
+import json
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+from text_chunker import iter_sentences, split_long_sentence
+from background_library import (
+    add_background, select_background, record_use, get_image_path, is_library_image, get_base_clip_path
+)
+from workspace import get_job_workspace, cleanup_job_workspace
+from checkpoints import stage_key, hash_file, load_checkpoint, save_checkpoint
+from audio_utils import build_mix_filter
+from openai_client import get_client
+from instrumentation import measure, get_file_size
+from ffmpeg_runner import run_ffmpeg, probe_duration, escape_filter_path, get_thread_limit
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Configure OpenAI
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-if not client.api_key:
-    raise ValueError("Please set OPENAI_API_KEY environment variable")
+# Whisper settings
+WHISPER_MODEL_SIZE = os.getenv("WHISPER_MODEL_SIZE", "base")
+WHISPER_THREADS = int(os.getenv("WHISPER_THREADS", "0"))  # 0 leaves torch's default
+WHISPER_SHARDS = int(os.getenv("WHISPER_SHARDS", "1"))  # Worker processes for one transcription
+WHISPER_SAMPLE_RATE = 16000  # whisper.audio.SAMPLE_RATE, without importing whisper
+SHARD_SEARCH_WINDOW = 10.0  # Seconds either side of an even split to look for silence
 
-def cleanup_temp_files():
-    """Clean up all temporary files created during processing."""
-    try:
-        # Patterns for temp files
-        temp_patterns = [
-            '*.srt',           # Subtitle files
-            '*TEMP*',          # FFmpeg temp files
-            '*.log',           # Log files
-            '*.mbtree',        # x264 temp files
-            '*.ffindex',       # FFmpeg index files
-            '*.lwi',           # LAV Filters index files
-            'ffmpeg*.txt',     # FFmpeg text files
-            '*.part'           # Partial downloads/processing
-        ]
-        
-        # Get current directory
-        current_dir = os.getcwd()
-        
-        # Clean up each pattern
-        for pattern in temp_patterns:
-            for file_path in glob.glob(os.path.join(current_dir, pattern)):
-                try:
-                    os.remove(file_path)
-                    logger.info(f"Cleaned up temporary file: {file_path}")
-                except Exception as e:
-                    logger.warning(f"Could not remove temporary file {file_path}: {str(e)}")
-                    
-    except Exception as e:
-        logger.error(f"Error during cleanup: {str(e)}")
+# Subtitle settings
+SUBTITLE_MODES = ("text", "whisper")
+SUBTITLE_MAX_CHARS = 84  # Longest caption built from the sermon text
+
+# Video encoding profiles for a still background with captions. "standard" is the
+# original render (x264 defaults at 25 fps); the others drop the frame rate, since the
+# picture only changes when a caption does, and trade compression for speed.
+ENCODING_PROFILES = {
+    "standard": {"fps": 25, "preset": "medium", "crf": 23},
+    "fast": {"fps": 2, "preset": "veryfast", "crf": 26},
+    "draft": {"fps": 1, "preset": "ultrafast", "crf": 30},
+}
+
+# Background generation
+BACKGROUND_PROMPT = (
+    "A serene and ethereal portrait of Jesus Christ in a contemplative pose, "
+    "inspired by classical Renaissance masters. The composition should be "
+    "centered with soft, divine lighting illuminating the figure against a "
+    "subtle, atmospheric background. The style should blend traditional "
+    "religious iconography with contemporary artistic sensibilities. "
+    "The color palette should be warm and inviting, with golden light "
+    "and deep, rich shadows. The overall mood should be peaceful and spiritual."
+)
+BASE_CLIP_SECONDS = 10  # Length of the pre-encoded clip that is looped under the audio
 
-# Register cleanup function to run on script exit
-atexit.register(cleanup_temp_files)
+# Image downloads
+DOWNLOAD_TIMEOUT = (10, 60)  # Seconds to connect, and between bytes received
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+DOWNLOAD_RETRIES = 3
 
-def create_srt_from_segments(segments):
-    """Create an SRT file from transcription segments."""
+# How captions are delivered: burned into the picture, muxed as a mov_text track
+# that players can toggle, or written as an .srt sidecar next to the MP4
+SUBTITLE_OUTPUTS = ("burn", "soft", "sidecar")
+
+# Pooled HTTP session shared by every download in this process
+_http_session = None
+_http_session_lock = threading.Lock()
+
+# Whisper models loaded in this process, by size, and shard worker pools by (size, shards)
+_whisper_models = {}
+_shard_pools = {}
+_whisper_lock = threading.Lock()
+
+def create_srt_from_segments(segments, output_dir=None):
+    """Create an SRT file from transcription segments.
+    Args:
+        output_dir (str, optional): Directory for the SRT file, e.g. a job workspace.
+            Defaults to the current directory.
+    """
     try:
         print("📝 Creating SRT subtitle file...")
         # Generate a unique SRT filename with timestamp
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        srt_path = f"temp_{timestamp}.srt"
+        srt_path = os.path.join(output_dir or "", f"temp_{timestamp}.srt")
         
         with open(srt_path, "w", encoding="utf-8") as f:
             for i, segment in enumerate(segments, 1):
@@ -78,11 +105,168 @@ def create_srt_from_segments(segments):
         print(f"❌ Error creating SRT file: {e}")
         return None
 
-def transcribe_audio(audio_path):
-    """Transcribe audio file using Whisper."""
+def get_whisper_model(model_size=None):
+    """Return a Whisper model, loading it on first use and reusing it afterwards.
+    Args:
+        model_size (str, optional): Model size such as "base" or "small". Defaults to WHISPER_MODEL_SIZE.
+    """
+    model_size = model_size or WHISPER_MODEL_SIZE
+    with _whisper_lock:
+        model = _whisper_models.get(model_size)
+        if model is None:
+            # Imported on first use: whisper pulls in torch, which takes seconds
+            import torch
+            import whisper
+            if WHISPER_THREADS:
+                torch.set_num_threads(WHISPER_THREADS)
+            print(f"🧠 Loading Whisper model '{model_size}'...")
+            model = whisper.load_model(model_size)
+            _whisper_models[model_size] = model
+        return model
+
+def unload_whisper_model(model_size=None):
+    """Release a cached Whisper model, or every cached model if no size is given.
+
+    Shard worker pools holding that model are shut down too.
+    """
+    with _whisper_lock:
+        if model_size is None:
+            _whisper_models.clear()
+            pools = list(_shard_pools.values())
+            _shard_pools.clear()
+        else:
+            _whisper_models.pop(model_size, None)
+            pools = [_shard_pools.pop(key) for key in list(_shard_pools) if key[0] == model_size]
+    for pool in pools:
+        pool.shutdown()
+
+def find_shard_boundaries(audio, shards, sample_rate=WHISPER_SAMPLE_RATE, window=SHARD_SEARCH_WINDOW):
+    """Pick sample offsets that split audio into shards at the quietest nearby point.
+
+    Each boundary starts at an even split and moves to the lowest-energy 50 ms frame
+    within `window` seconds, so shards are cut in pauses rather than mid-word.
+    """
+    import numpy as np
+    frame = sample_rate // 20
+    energy = np.square(audio[:len(audio) // frame * frame].reshape(-1, frame)).mean(axis=1)
+    radius = int(window * sample_rate) // frame
+
+    boundaries = [0]
+    for k in range(1, shards):
+        target = len(energy) * k // shards
+        lo = max(target - radius, boundaries[-1] // frame + 1)
+        hi = min(target + radius, len(energy))
+        if lo >= hi:
+            continue
+        boundaries.append((lo + int(np.argmin(energy[lo:hi]))) * frame)
+    boundaries.append(len(audio))
+    return boundaries
+
+def _init_shard_worker(model_size, threads):
+    """Process pool initializer: size torch's thread pool and load this worker's model."""
+    import torch
+    if threads:
+        torch.set_num_threads(threads)
+    get_whisper_model(model_size)
+
+def _wait_for_shard_workers(barrier):
+    barrier.wait()
+
+def warm_shard_pool(model_size=None, shards=WHISPER_SHARDS):
+    """Start the shard pool's workers and wait until they have loaded their models.
+
+    Workers load their model in the pool initializer. The warm-up tasks wait on a shared
+    barrier, so they only return once all `shards` workers are running one each.
+    """
+    pool = get_shard_pool(model_size, shards)
+    with multiprocessing.get_context("spawn").Manager() as manager:
+        barrier = manager.Barrier(shards)
+        for future in [pool.submit(_wait_for_shard_workers, barrier) for _ in range(shards)]:
+            future.result()
+
+def _transcribe_shard(audio, model_size):
+    return get_whisper_model(model_size).transcribe(audio)["segments"]
+
+def get_shard_pool(model_size=None, shards=WHISPER_SHARDS):
+    """Return this process's pool of `shards` transcription workers, starting it on first use.
+
+    Each worker loads its model once when it starts and keeps it for every later
+    transcription. Torch threads are split so the workers together use this render
+    job's share of the CPUs (CPUs / render workers, see ffmpeg_runner.set_thread_limit).
+    """
+    model_size = model_size or WHISPER_MODEL_SIZE
+    with _whisper_lock:
+        pool = _shard_pools.get((model_size, shards))
+        if pool is None:
+            cpu_share = get_thread_limit() or os.cpu_count() or 1
+            threads = WHISPER_THREADS or max(1, cpu_share // shards)
+            # Spawned, since this process may have threads running (e.g. background generation)
+            pool = ProcessPoolExecutor(max_workers=shards, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_shard_worker, initargs=(model_size, threads))
+            _shard_pools[(model_size, shards)] = pool
+        return pool
+
+def _discard_shard_pool(pool):
+    with _whisper_lock:
+        for key in [key for key, value in _shard_pools.items() if value is pool]:
+            del _shard_pools[key]
+    pool.shutdown(wait=False)
+
+def transcribe_audio_sharded(audio_path, shards=WHISPER_SHARDS, model_size=None):
+    """Transcribe audio across processes, one shard each, and merge the segments.
+
+    The audio is split at silences, each worker of the shard pool (see get_shard_pool)
+    transcribes one shard, and segment timestamps are shifted by their shard's offset.
+    """
+    import whisper
+    audio = whisper.load_audio(audio_path)
+    boundaries = find_shard_boundaries(audio, shards)
+
+    pool = get_shard_pool(model_size, shards)
+    try:
+        futures = [
+            pool.submit(_transcribe_shard, audio[start:end], model_size)
+            for start, end in zip(boundaries, boundaries[1:])
+        ]
+        shard_segments = [future.result() for future in futures]
+    except Exception:
+        # The pool may be broken (e.g. a worker was killed); start a fresh one next time
+        _discard_shard_pool(pool)
+        raise
+
+    segments = []
+    for start, shard in zip(boundaries, shard_segments):
+        offset = start / WHISPER_SAMPLE_RATE
+        for segment in shard:
+            segment = dict(segment, start=segment["start"] + offset, end=segment["end"] + offset)
+            segment["id"] = len(segments)
+            segments.append(segment)
+    return segments
+
+def transcribe_audio(audio_path, model_size=None, shards=None):
+    """Transcribe audio file using Whisper.
+    Args:
+        shards (int, optional): Split the audio across this many worker processes.
+            Defaults to WHISPER_SHARDS; 1 transcribes in this process.
+    """
+    shards = shards or WHISPER_SHARDS
+    with measure("whisper", shards=shards, bytes_in=get_file_size(audio_path)) as event:
+        segments = _transcribe_audio(audio_path, model_size, shards)
+        event["ok"] = segments is not None
+        event["segments"] = len(segments or [])
+    return segments
+
+def _transcribe_audio(audio_path, model_size, shards):
     print("🎤 Transcribing audio...")
     try:
-        model = whisper.load_model("base")
+        if shards > 1:
+            try:
+                segments = transcribe_audio_sharded(audio_path, shards, model_size)
+                print(f"✅ Audio transcription completed across {shards} processes")
+                return segments
+            except Exception as e:
+                print(f"⚠️  Sharded transcription failed ({e}), transcribing in one process")
+        model = get_whisper_model(model_size)
         result = model.transcribe(audio_path)
         print("✅ Audio transcription completed")
         return result["segments"]
@@ -90,6 +274,94 @@ def transcribe_audio(audio_path):
         print(f"❌ Error transcribing audio: {e}")
         return None
 
+def segments_from_chunk_timings(chunk_timings, max_chars=SUBTITLE_MAX_CHARS):
+    """Build subtitle segments from the sermon text and the duration of each TTS chunk.
+
+    Each chunk is split into sentence-sized captions (long sentences are wrapped at
+    max_chars) and the chunk's duration is shared between them by character count.
+    Args:
+        chunk_timings (list): [{"text": ..., "duration": ...}] as written by
+            audio_utils.write_chunk_timings, in playback order.
+    """
+    segments = []
+    offset = 0.0
+    for chunk in chunk_timings:
+        captions = [
+            piece
+            for sentence, _ in iter_sentences(chunk["text"])
+            for piece in split_long_sentence(sentence, max_chars)
+        ]
+        total_chars = sum(len(caption) for caption in captions)
+        start = offset
+        for caption in captions:
+            end = start + chunk["duration"] * len(caption) / total_chars
+            segments.append({"start": start, "end": end, "text": caption})
+            start = end
+        offset += chunk["duration"]
+    return segments
+
+def load_text_segments(timing_path):
+    """Load chunk timings and turn them into subtitle segments, or None if unavailable."""
+    try:
+        with open(timing_path, "r", encoding="utf-8") as f:
+            chunk_timings = json.load(f)
+        segments = segments_from_chunk_timings(chunk_timings)
+        print("✅ Subtitles timed from sermon text")
+        return segments or None
+    except Exception as e:
+        print(f"⚠️  Could not build subtitles from sermon text: {e}")
+        return None
+
+def get_http_session():
+    """Return the process-wide requests session, with keep-alive pooling and retries."""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            retry = Retry(total=DOWNLOAD_RETRIES, backoff_factor=0.5,
+                          status_forcelist=(429, 500, 502, 503, 504), allowed_methods=frozenset(["GET"]))
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
+
+def download_file(url, path):
+    """Stream a URL to disk in chunks, so memory stays flat whatever the file size.
+
+    The body goes to a .part file that is renamed into place once complete; a
+    connection dropped mid-body is retried from the start.
+    """
+    if url.startswith("file://"):
+        # Responses replayed from the OpenAI cache point at local files
+        shutil.copyfile(url2pathname(urlparse(url).path), path)
+        return path
+
+    import requests
+    part_path = f"{path}.part"
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        try:
+            with get_http_session().get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                response.raise_for_status()
+                with open(part_path, "wb") as f:
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+            os.replace(part_path, path)
+            return path
+        # A connection dropped mid-body surfaces from iter_content as ChunkedEncodingError
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            if attempt == DOWNLOAD_RETRIES:
+                raise
+            print(f"⚠️  Download interrupted ({e}), retrying...")
+            time.sleep(2 ** attempt)
+        finally:
+            # Never leave a partial body behind, whatever the failure
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
 def generate_background_image(base_name=None):
     """Generate a background image using DALL-E 3.
     Args:
@@ -104,19 +376,12 @@ def generate_background_image(base_name=None):
             "size": "1792x1024",  # 16:9 widescreen aspect ratio
             "quality": "standard",
             "style": "natural",
-            "prompt": (
-               "A serene and ethereal portrait of Jesus Christ in a contemplative pose, "
-                "inspired by classical Renaissance masters. The composition should be "
-                "centered with soft, divine lighting illuminating the figure against a "
-                "subtle, atmospheric background. The style should blend traditional "
-                "religious iconography with contemporary artistic sensibilities. "
-                "The color palette should be warm and inviting, with golden light "
-                "and deep, rich shadows. The overall mood should be peaceful and spiritual."
-            )
+            "prompt": BACKGROUND_PROMPT
         }
         
         # Generate the image
-        response = client.images.generate(**image_params)
+        with measure("image", model=image_params["model"], size=image_params["size"]):
+            response = get_client().images.generate(**image_params)
         print("✅ Background image generated successfully")
         
         # Get the image URL from the response
@@ -125,70 +390,262 @@ def generate_background_image(base_name=None):
         # Create backgrounds directory if it doesn't exist
         os.makedirs("backgrounds", exist_ok=True)
         
+        # Use provided base_name or generate timestamp
+        if base_name:
+            image_path = f"backgrounds/{base_name}_background.png"
+        else:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            image_path = f"backgrounds/background_{timestamp}.png"
+        
         # Download and save the image
         print("📥 Downloading background image...")
-        image_response = requests.get(image_url)
-        if image_response.status_code == 200:
-            # Use provided base_name or generate timestamp
-            if base_name:
-                image_path = f"backgrounds/{base_name}_background.png"
-            else:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                image_path = f"backgrounds/background_{timestamp}.png"
-                
-            with open(image_path, "wb") as f:
-                f.write(image_response.content)
-            print(f"✅ Background image saved to: {image_path}")
-            return image_path
-        else:
-            print(f"❌ Failed to download image: {image_response.status_code}")
-            return None
+        with measure("image_download") as event:
+            download_file(image_url, image_path)
+            event["bytes_in"] = get_file_size(image_path)
+        print(f"✅ Background image saved to: {image_path}")
+        return image_path
             
     except Exception as e:
         print(f"❌ Error generating background image: {e}")
         return None
 
-def create_video_with_subtitles(audio_file, output_path, use_generated_bg=True, base_name=None):
-    """Create a video with subtitles using FFmpeg."""
+def get_library_background(topic=None, policy="least_used"):
+    """Return a background from the library, generating and adding a new one when needed.
+    Args:
+        topic (str, optional): Sermon topic; images made for the same topic are preferred.
+        policy (str): One of background_library.SELECTION_POLICIES.
+    """
     try:
-        # Generate background image if enabled
-        background_path = generate_background_image(base_name) if use_generated_bg else "assets/default_background.png"
-        if not background_path:
-            print("⚠️  Failed to generate background image, using default background")
+        entry = select_background(topic, policy)
+        if entry:
+            print(f"♻️  Reusing library background {entry['id']} ({entry['uses']} uses)")
+            return get_image_path(entry)
+
+        image_path = generate_background_image()
+        if not image_path:
+            return None
+        entry = add_background(image_path, BACKGROUND_PROMPT, topic)
+        record_use(entry["id"])
+        os.remove(image_path)
+        return get_image_path(entry)
+    except Exception as e:
+        print(f"❌ Error getting library background: {e}")
+        return None
+
+def ensure_base_clip(image_path, encoding_profile):
+    """Encode a short looping clip of a library image once per profile and return its path."""
+    clip_path = get_base_clip_path(image_path, encoding_profile)
+    if os.path.exists(clip_path):
+        return clip_path
+
+    profile = ENCODING_PROFILES[encoding_profile]
+    os.makedirs(os.path.dirname(clip_path), exist_ok=True)
+    tmp_path = f"{clip_path}.{os.getpid()}.part.mp4"
+    ffmpeg_args = [
+        "-loop", "1", "-framerate", str(profile["fps"]), "-i", image_path, "-t", str(BASE_CLIP_SECONDS),
+        "-c:v", "libx264", "-tune", "stillimage", "-preset", profile["preset"], "-crf", str(profile["crf"]),
+        "-r", str(profile["fps"]), "-pix_fmt", "yuv420p",
+    ]
+    result = run_ffmpeg(ffmpeg_args, tmp_path, duration=BASE_CLIP_SECONDS, label="base clip")
+    if result.returncode != 0:
+        print(f"⚠️  Could not pre-encode base clip: {result.stderr}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+    # Concurrent renders may race to create the same clip; either copy is fine
+    os.replace(tmp_path, clip_path)
+    print(f"✅ Pre-encoded base clip: {clip_path}")
+    return clip_path
+
+def get_sidecar_path(video_path):
+    """Path of the .srt sidecar written next to a video."""
+    return os.path.splitext(video_path)[0] + ".srt"
+
+def encode_video(background_path, audio_file, srt_path, output_path, encoding_profile="standard", crf=None,
+                 subtitle_output="burn", base_clip=None, music_path=None):
+    """Encode a still background, audio and captions into an MP4 in one FFmpeg pass.
+    Args:
+        audio_file: A mixed audio file, or a list of TTS chunk files. Chunks are joined
+            (and music_path mixed under them) inside the same filter graph, so the audio
+            is decoded and encoded once with no intermediate files.
+        subtitle_output (str): One of SUBTITLE_OUTPUTS. Only "burn" draws the captions
+            into the picture; "soft" and "sidecar" leave the video stream caption-free.
+        base_clip (str, optional): Pre-encoded clip of the background (see ensure_base_clip).
+            Without burned-in captions it is looped and stream-copied instead of encoding.
+        music_path (str, optional): Prepared music bed (see prepare_music_bed), looped under the voice.
+    Returns:
+        tuple: (CompletedProcess, encode time in seconds)
+    """
+    profile = ENCODING_PROFILES[encoding_profile]
+    crf = profile["crf"] if crf is None else crf
+    audio_files = audio_file if isinstance(audio_file, (list, tuple)) else [audio_file]
+
+    # Input 0 is the video, then the voice input(s), the music and the soft subtitles
+    if base_clip and subtitle_output != "burn":
+        inputs = [["-stream_loop", "-1", "-i", base_clip]]
+        video_args = ["-c:v", "copy"]
+    else:
+        inputs = [["-loop", "1", "-framerate", str(profile["fps"]), "-i", background_path]]
+        video_args = [
+            "-c:v", "libx264", "-tune", "stillimage", "-preset", profile["preset"], "-crf", str(crf),
+            "-r", str(profile["fps"]), "-pix_fmt", "yuv420p",
+        ]
+    inputs += [["-i", path] for path in audio_files]
+    voice_labels = [f'{i}:a' for i in range(1, len(audio_files) + 1)]
+    music_label = None
+    if music_path:
+        inputs.append(["-stream_loop", "-1", "-i", music_path])
+        music_label = f'{len(inputs) - 1}:a'
+
+    filters = []
+    if len(voice_labels) == 1 and not music_label:
+        audio_map = voice_labels[0]
+    else:
+        filters.append(build_mix_filter(voice_labels, music_label))
+        audio_map = '[aout]'
+
+    if subtitle_output == "burn":
+        filters.append(
+            f'[0:v]subtitles={escape_filter_path(srt_path)}:force_style=\'FontName=Arial,FontSize=24,PrimaryColour=&HFFFFFF,OutlineColour=&H000000,OutlineWidth=2,BorderStyle=4,BackColour=&H80000000,Alignment=2\'[vout]'
+        )
+        video_map = '[vout]'
+    else:
+        video_map = '0:v'
+
+    subtitle_args = []
+    if subtitle_output == "soft":
+        inputs.append(["-i", srt_path])
+        subtitle_args = ["-map", f"{len(inputs) - 1}:s", "-c:s", "mov_text", "-metadata:s:s:0", "language=eng"]
+
+    ffmpeg_args = [arg for input_args in inputs for arg in input_args]
+    if filters:
+        ffmpeg_args += ["-filter_complex", ";".join(filters)]
+    ffmpeg_args += ["-map", video_map, "-map", audio_map]
+    ffmpeg_args += subtitle_args + video_args
+    ffmpeg_args += ["-c:a", "aac", "-b:a", "192k", "-shortest"]
+
+    try:
+        duration = sum(probe_duration(path) for path in audio_files)
+    except Exception:
+        duration = None  # Only used to report progress
+
+    started = time.perf_counter()
+    with measure("encode", profile=encoding_profile, subtitle_output=subtitle_output,
+                 bytes_in=get_file_size(audio_file)) as event:
+        result = run_ffmpeg(ffmpeg_args, output_path, duration=duration, label=f"encode ({encoding_profile})")
+        event["ok"] = result.returncode == 0
+        event["speed"] = result.speed
+        event["bytes_out"] = get_file_size(output_path)
+    if result.returncode == 0 and subtitle_output == "sidecar":
+        shutil.copyfile(srt_path, get_sidecar_path(output_path))
+    return result, time.perf_counter() - started
+
+def replace_subtitles(video_path, srt_path, output_path):
+    """Swap the soft subtitle track of a video without re-encoding audio or video."""
+    ffmpeg_args = [
+        "-i", video_path, "-i", srt_path,
+        "-map", "0:v", "-map", "0:a", "-map", "1:s", "-c:v", "copy", "-c:a", "copy", "-c:s", "mov_text",
+        "-metadata:s:s:0", "language=eng",
+    ]
+    result = run_ffmpeg(ffmpeg_args, output_path, label="replace subtitles")
+    if result.returncode != 0:
+        print(f"❌ FFmpeg error: {result.stderr}")
+        return False
+    print(f"✅ Subtitles replaced: {output_path}")
+    return True
+
+def create_video_with_subtitles(audio_file, output_path, use_generated_bg=True, base_name=None, background_path=None,
+                                workdir=None, subtitle_mode="whisper", timing_path=None,
+                                encoding_profile="standard", crf=None, subtitle_output="burn", use_base_clip=False,
+                                music_path=None):
+    """Create a video with subtitles using FFmpeg.
+    Args:
+        audio_file: The mixed audio file, or a list of TTS chunk files for a single-pass
+            render that joins the chunks and mixes music_path in the same FFmpeg graph.
+            Chunk lists need subtitle_mode="text", since there is no single file to transcribe.
+        background_path (str, optional): Pre-generated background image. When given, no new
+            image is generated; it is still removed afterwards if use_generated_bg is set.
+        workdir (str, optional): Job workspace for intermediate files such as the SRT.
+        subtitle_mode (str): "text" times captions from the sermon text and the TTS chunk
+            durations in timing_path; "whisper" transcribes the audio. Text mode falls
+            back to Whisper when the timings are missing.
+        timing_path (str, optional): Chunk timings written by audio_utils.text_to_audio.
+        encoding_profile (str): One of ENCODING_PROFILES.
+        crf (int, optional): Override the profile's x264 CRF.
+        subtitle_output (str): One of SUBTITLE_OUTPUTS: burn the captions in, add them as a
+            soft mov_text track, or write an .srt sidecar next to output_path.
+        use_base_clip (bool): For library backgrounds without burned-in captions, loop a
+            cached pre-encoded clip of the background instead of encoding the video.
+        music_path (str, optional): Prepared music bed to mix in during the render.
+    """
+    background_pool = ThreadPoolExecutor(max_workers=1)
+    try:
+        # Generate the background image in the background while the subtitles are prepared
+        background_future = None
+        if not background_path and use_generated_bg:
+            background_future = background_pool.submit(generate_background_image, base_name)
+        elif not background_path:
             background_path = "assets/default_background.png"
             
-        # Create SRT file from transcription
-        segments = transcribe_audio(audio_file)
+        # Create SRT file from the sermon text or from transcription, reusing the
+        # workspace checkpoint when the audio and timings are unchanged
+        segments = None
+        subtitles_key = None
+        if workdir:
+            audio_files = audio_file if isinstance(audio_file, (list, tuple)) else [audio_file]
+            subtitles_key = stage_key(subtitle_mode, WHISPER_MODEL_SIZE, [hash_file(f) for f in audio_files],
+                                      hash_file(timing_path))
+            segments_path = load_checkpoint(workdir, "subtitles", subtitles_key)
+            if segments_path:
+                with open(segments_path, "r", encoding="utf-8") as f:
+                    segments = json.load(f)
+                print("♻️  Reusing subtitle segments from checkpoint")
+        if not segments and subtitle_mode == "text" and timing_path:
+            segments = load_text_segments(timing_path)
+        if not segments and isinstance(audio_file, (list, tuple)):
+            print("❌ Single-pass render needs subtitles from the sermon text, but no chunk timings are available")
+            return False
+        if not segments:
+            segments = transcribe_audio(audio_file)
         if not segments:
             print("❌ Failed to transcribe audio")
             return False
+        if subtitles_key and not segments_path:
+            segments_path = os.path.join(workdir, "segments.json")
+            with open(segments_path, "w", encoding="utf-8") as f:
+                json.dump(segments, f, ensure_ascii=False, default=float)
+            save_checkpoint(workdir, "subtitles", subtitles_key, segments_path)
             
-        srt_path = create_srt_from_segments(segments)
+        srt_path = create_srt_from_segments(segments, output_dir=workdir)
         if not srt_path:
             print("❌ Failed to create SRT file")
             return False
             
-        # Construct FFmpeg command
-        print("🎬 Creating video with FFmpeg...")
-        ffmpeg_cmd = (
-            f'ffmpeg -y -loop 1 -i "{background_path}" -i "{audio_file}" '
-            f'-vf "subtitles={srt_path}:force_style=\'FontName=Arial,FontSize=24,PrimaryColour=&HFFFFFF,OutlineColour=&H000000,OutlineWidth=2,BorderStyle=4,BackColour=&H80000000,Alignment=2\'" '
-            f'-c:v libx264 -tune stillimage -c:a aac -b:a 192k -pix_fmt yuv420p '
-            f'-shortest "{output_path}"'
-        )
-        
-        # Run FFmpeg command
-        result = subprocess.run(ffmpeg_cmd, shell=True, capture_output=True, text=True)
+        if background_future:
+            background_path = background_future.result()
+        if not background_path:
+            print("⚠️  Failed to generate background image, using default background")
+            background_path = "assets/default_background.png"
+            
+        # Render the video
+        print(f"🎬 Creating video with FFmpeg ({encoding_profile} profile)...")
+        base_clip = None
+        if use_base_clip and subtitle_output != "burn" and is_library_image(background_path):
+            base_clip = ensure_base_clip(background_path, encoding_profile)
+        result, encode_time = encode_video(background_path, audio_file, srt_path, output_path,
+                                           encoding_profile, crf, subtitle_output, base_clip, music_path)
         
         # Clean up temporary files
         print("🧹 Cleaning up temporary files...")
         if os.path.exists(srt_path):
             os.remove(srt_path)
-        if use_generated_bg and os.path.exists(background_path):
+        if use_generated_bg and os.path.exists(background_path) and not is_library_image(background_path):
             os.remove(background_path)
             
         if result.returncode == 0:
-            print(f"✅ Video created successfully: {output_path}")
+            size_mb = os.path.getsize(output_path) / (1024 * 1024)
+            print(f"✅ Video created successfully: {output_path} "
+                  f"({encoding_profile}: {encode_time:.1f}s, {size_mb:.1f} MB)")
             return True
         else:
             print(f"❌ FFmpeg error: {result.stderr}")
@@ -197,6 +654,8 @@ def create_video_with_subtitles(audio_file, output_path, use_generated_bg=True,
     except Exception as e:
         print(f"❌ Error creating video: {e}")
         return False
+    finally:
+        background_pool.shutdown(wait=False)
 
 def main():
     """Main function to process all untreated audio files."""
@@ -232,8 +691,11 @@ def main():
                 output_path = os.path.join("videos", 
                                          os.path.basename(audio_file).replace(".mp3", ".mp4"))
                 
-                if create_video_with_subtitles(audio_file, output_path):
+                job_id = os.path.splitext(os.path.basename(audio_file))[0]
+                workdir = get_job_workspace(job_id)
+                if create_video_with_subtitles(audio_file, output_path, workdir=workdir):
                     print(f"✅ Successfully created video: {os.path.basename(output_path)}")
+                    cleanup_job_workspace(job_id)
                 else:
                     print(f"❌ Failed to create video for: {os.path.basename(audio_file)}")
                     
@@ -0,0 +1,160 @@
+"""Shared execution layer for FFmpeg and ffprobe.
+
+Commands are argv lists (no shell, so any path works). FFmpeg reports progress on a
+pipe, which is parsed to log encode speed and ETA; stderr is kept only as a bounded
+tail; every run has a timeout; and encoder/filter threads are capped by FFMPEG_THREADS
+so concurrent jobs share the CPUs instead of each starting a thread per core.
+"""
+import os
+import time
+import logging
+import threading
+import subprocess
+from collections import deque
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFPROBE_BIN = os.getenv("FFPROBE_BIN", "ffprobe")
+FFMPEG_TIMEOUT = float(os.getenv("FFMPEG_TIMEOUT", "3600"))  # Seconds per FFmpeg run
+FFPROBE_TIMEOUT = 60.0
+STDERR_TAIL_LINES = 40
+PROGRESS_LOG_INTERVAL = 10.0  # Seconds between progress log lines
+THREADS_ENV = "FFMPEG_THREADS"  # Threads per FFmpeg process; 0 or unset leaves FFmpeg's default
+
+def get_thread_limit():
+    """Threads each FFmpeg process may use (read at call time, so workers inherit it)."""
+    return int(os.getenv(THREADS_ENV, "0") or 0)
+
+def set_thread_limit(concurrent_jobs):
+    """Share the CPUs between this many concurrent FFmpeg jobs. Returns the per-job limit."""
+    threads = max(1, (os.cpu_count() or 1) // max(1, concurrent_jobs))
+    os.environ[THREADS_ENV] = str(threads)
+    return threads
+
+def escape_filter_path(path):
+    """Escape a file path for use as a filter option value inside a filtergraph."""
+    for char in ("\\", "'", ":"):
+        path = path.replace(char, "\\" + char)
+    # Second level: the filtergraph parser
+    for char in ("\\", "'", "[", "]", ",", ";"):
+        path = path.replace(char, "\\" + char)
+    return path
+
+def _parse_time(progress):
+    # out_time_us is microseconds; older FFmpeg builds only report out_time_ms (also microseconds)
+    value = progress.get("out_time_us") or progress.get("out_time_ms")
+    try:
+        return int(value) / 1_000_000
+    except (TypeError, ValueError):
+        return None
+
+def _parse_speed(progress):
+    try:
+        return float(progress.get("speed", "").rstrip("x"))
+    except ValueError:
+        return None
+
+def run_ffmpeg(args, output_path, timeout=None, duration=None, label="ffmpeg", threads=None):
+    """Run FFmpeg and wait for it.
+    Args:
+        args (list): Input and processing arguments, without the binary or the output path.
+        output_path (str): The output file, overwritten if it exists.
+        timeout (float, optional): Kill FFmpeg after this many seconds. Defaults to FFMPEG_TIMEOUT.
+        duration (float, optional): Length of the output in seconds, for progress and ETA.
+        label (str): Name used in log lines.
+        threads (int, optional): Thread cap for this run. Defaults to get_thread_limit().
+    Returns:
+        subprocess.CompletedProcess: stderr holds the last STDERR_TAIL_LINES lines. Also
+        carries elapsed (seconds) and speed (the last reported multiple of real time).
+    """
+    timeout = FFMPEG_TIMEOUT if timeout is None else timeout
+    threads = get_thread_limit() if threads is None else threads
+    thread_args = ["-filter_complex_threads", str(threads)] if threads else []
+    output_threads = ["-threads", str(threads)] if threads else []
+    argv = (
+        [FFMPEG_BIN, "-hide_banner", "-nostdin", "-y", "-nostats", "-progress", "pipe:1"]
+        + thread_args + list(args) + output_threads + [output_path]
+    )
+
+    started = time.monotonic()
+    stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+    process = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors="replace")
+
+    def drain_stderr():
+        for line in process.stderr:
+            stderr_tail.append(line.rstrip("\n"))
+
+    stderr_reader = threading.Thread(target=drain_stderr, daemon=True)
+    stderr_reader.start()
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        process.kill()
+
+    watchdog = threading.Timer(timeout, kill)
+    watchdog.daemon = True
+    watchdog.start()
+
+    progress = {}
+    speed = None
+    last_logged = started
+    try:
+        for line in process.stdout:
+            key, _, value = line.strip().partition("=")
+            progress[key] = value
+            if key != "progress":
+                continue
+            # A block of key=value lines ends with progress=continue|end
+            speed = _parse_speed(progress) or speed
+            now = time.monotonic()
+            if value == "continue" and now - last_logged >= PROGRESS_LOG_INTERVAL:
+                last_logged = now
+                logger.info(f"{label}: {_format_progress(_parse_time(progress), duration, speed)}")
+        returncode = process.wait()
+    finally:
+        watchdog.cancel()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        stderr_reader.join(timeout=5)
+
+    elapsed = time.monotonic() - started
+    if timed_out.is_set():
+        stderr_tail.append(f"Timed out after {timeout:.0f}s")
+        logger.error(f"{label}: killed after {timeout:.0f}s")
+    elif returncode == 0:
+        logger.info(f"{label}: finished in {elapsed:.1f}s" + (f" ({speed:.1f}x real time)" if speed else ""))
+
+    result = subprocess.CompletedProcess(argv, returncode, stdout=None, stderr="\n".join(stderr_tail))
+    result.elapsed = elapsed
+    result.speed = speed
+    return result
+
+def _format_progress(position, duration, speed):
+    parts = []
+    if position is not None and duration:
+        parts.append(f"{min(100.0, 100 * position / duration):.0f}%")
+    elif position is not None:
+        parts.append(f"{position:.0f}s encoded")
+    if speed:
+        parts.append(f"{speed:.1f}x")
+        if position is not None and duration:
+            parts.append(f"ETA {max(0.0, duration - position) / speed:.0f}s")
+    return ", ".join(parts) or "running"
+
+def run_ffprobe(args, timeout=FFPROBE_TIMEOUT):
+    """Run ffprobe with args (without the binary) and return its stdout; raises on failure."""
+    result = subprocess.run([FFPROBE_BIN, "-v", "error"] + list(args),
+                            capture_output=True, text=True, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe error: {result.stderr[-2000:]}")
+    return result.stdout
+
+def probe_duration(path):
+    """Duration of a media file in seconds."""
+    output = run_ffprobe(["-show_entries", "format=duration",
+                          "-of", "default=noprint_wrappers=1:nokey=1", path])
+    return float(output.strip())
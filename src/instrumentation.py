@@ -0,0 +1,178 @@
+"""Per-stage measurements written as a JSON-lines event stream.
+
+Every measured stage appends one event to the run's file: wall time, CPU time of the
+thread that ran it, CPU time of the subprocesses it waited for (FFmpeg, ffprobe), peak
+RSS, and whatever the stage adds (bytes in/out, tokens, characters, cost). The run id
+is passed to worker processes through the environment, so render workers append to the
+same file. Outside a run started with start_run, nothing is written.
+"""
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.getenv("METRICS_DIR", "state/metrics")
+RUN_ID_ENV = "PIPELINE_RUN_ID"
+
+# Job the current stage belongs to; inherited by nested stages
+_current_job = contextvars.ContextVar("current_job", default=None)
+_write_lock = threading.Lock()
+
+def start_run(run_id=None):
+    """Start recording events for this process and the workers it starts. Returns the events path."""
+    run_id = run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+    os.environ[RUN_ID_ENV] = run_id
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    return get_events_path(run_id)
+
+def get_events_path(run_id=None):
+    """JSON-lines file of a run (the current one by default), or None outside a run."""
+    run_id = run_id or os.getenv(RUN_ID_ENV)
+    return os.path.join(METRICS_DIR, f"{run_id}.jsonl") if run_id else None
+
+def record_event(stage, **fields):
+    """Append one event to the current run's stream."""
+    path = get_events_path()
+    if path is None:
+        return
+    event = {"ts": time.time(), "run_id": os.getenv(RUN_ID_ENV), "pid": os.getpid(), "stage": stage}
+    if "job_id" not in fields:
+        fields["job_id"] = _current_job.get()
+    event.update(fields)
+    line = json.dumps(event, default=str) + "\n"
+    try:
+        # One write per event on an O_APPEND descriptor, so lines from
+        # concurrent processes never interleave
+        with _write_lock:
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode("utf-8"))
+            finally:
+                os.close(fd)
+    except OSError as e:
+        logger.warning(f"Could not record {stage} event: {str(e)}")
+
+def _children_cpu():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def _peak_rss_mb():
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    import psutil
+    return psutil.Process().memory_info().peak_wset / 1024 ** 2
+
+def get_file_size(path):
+    """Size of a file (or the total of a list of files) in bytes, 0 if missing."""
+    paths = path if isinstance(path, (list, tuple)) else [path]
+    return sum(os.path.getsize(p) for p in paths if p and os.path.exists(p))
+
+@contextmanager
+def measure(stage, job_id=None, **fields):
+    """Measure a stage and record it when the block exits.
+
+    Yields the event dict so the stage can add counters such as bytes_out or tokens.
+    Stages nested inside a job's stage inherit its job_id; worker threads do too when
+    submitted with contextvars.copy_context().run. Child CPU time counts every
+    subprocess this process reaped meanwhile, so it overlaps between concurrent stages.
+
+    Usage:
+        with measure("mix", bytes_in=get_file_size(voice_path)) as event:
+            ...
+            event["bytes_out"] = get_file_size(output_path)
+    """
+    token = _current_job.set(job_id) if job_id is not None else None
+    event = dict(fields)
+    started = time.perf_counter()
+    cpu_started = time.thread_time()
+    children_started = _children_cpu()
+    try:
+        yield event
+    except BaseException as e:
+        event.setdefault("ok", False)
+        event.setdefault("error", str(e))
+        raise
+    finally:
+        event.setdefault("ok", True)
+        event["wall_s"] = round(time.perf_counter() - started, 4)
+        event["cpu_s"] = round(time.thread_time() - cpu_started, 4)
+        event["child_cpu_s"] = round(_children_cpu() - children_started, 4)
+        event["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+        record_event(stage, **event)
+        if token is not None:
+            _current_job.reset(token)
+
+def load_events(path=None):
+    """Read a run's events (the current run by default)."""
+    path = path or get_events_path()
+    events = []
+    if not path or not os.path.exists(path):
+        return events
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                events.append(json.loads(line))
+    return events
+
+def percentile(values, pct):
+    """The pct-th percentile of values (nearest rank), 0.0 if empty."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+SUMMARY_COUNTERS = ("bytes_in", "bytes_out", "chars", "prompt_tokens", "completion_tokens", "cost")
+
+def summarize_events(events):
+    """Aggregate events per stage, in the order stages first appeared."""
+    stages = {}
+    for event in events:
+        stats = stages.setdefault(event["stage"], {"count": 0, "failed": 0, "wall": [], "cpu_s": 0.0,
+                                                   "child_cpu_s": 0.0, "peak_rss_mb": 0.0})
+        stats["count"] += 1
+        stats["failed"] += not event.get("ok", True)
+        stats["wall"].append(event.get("wall_s", 0.0))
+        stats["cpu_s"] += event.get("cpu_s", 0.0)
+        stats["child_cpu_s"] += event.get("child_cpu_s", 0.0)
+        stats["peak_rss_mb"] = max(stats["peak_rss_mb"], event.get("peak_rss_mb", 0.0))
+        for counter in SUMMARY_COUNTERS:
+            if event.get(counter):
+                stats[counter] = stats.get(counter, 0) + event[counter]
+
+    for stats in stages.values():
+        wall = stats.pop("wall")
+        stats["wall_s"] = sum(wall)
+        stats["p50_s"] = percentile(wall, 50)
+        stats["p95_s"] = percentile(wall, 95)
+    return stages
+
+def format_summary(events):
+    """End-of-run table: one row per stage."""
+    stages = summarize_events(events)
+    header = (f"{'stage':<16} {'n':>4} {'fail':>4} {'total s':>9} {'p50 s':>8} {'p95 s':>8} "
+              f"{'cpu s':>8} {'child s':>8} {'rss MB':>8} {'MB out':>8} {'tokens':>8} {'chars':>8} {'cost $':>8}")
+    rows = [header, "-" * len(header)]
+    for stage, s in stages.items():
+        tokens = s.get("prompt_tokens", 0) + s.get("completion_tokens", 0)
+        rows.append(
+            f"{stage:<16} {s['count']:>4} {s['failed']:>4} {s['wall_s']:>9.1f} {s['p50_s']:>8.2f} "
+            f"{s['p95_s']:>8.2f} {s['cpu_s']:>8.1f} {s['child_cpu_s']:>8.1f} {s['peak_rss_mb']:>8.0f} "
+            f"{s.get('bytes_out', 0) / 1024 ** 2:>8.1f} {tokens:>8} {s.get('chars', 0):>8} {s.get('cost', 0):>8.4f}"
+        )
+    return "\n".join(rows)
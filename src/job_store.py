@@ -0,0 +1,184 @@
+"""SQLite record of every sermon job's status, last completed stage and artifacts."""
+import os
+import json
+import sqlite3
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "state/jobs.db")
+
+# Job statuses. "running" rows left behind by a process that died are reset to "failed".
+# "invalid" sermons (e.g. a badly named file) are never retried.
+PENDING, RUNNING, FAILED, DONE, INVALID = "pending", "running", "failed", "done", "invalid"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    sermon_file TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    stage TEXT,
+    artifacts TEXT NOT NULL DEFAULT '{}',
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    pid INTEGER,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def connect(db_path=JOB_DB_PATH):
+    """Open the job database, creating it if needed."""
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+@contextmanager
+def _transaction(db_path):
+    """Connection that commits on success and is always closed."""
+    conn = connect(db_path)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+def get_job_id(sermon_file):
+    """Jobs are keyed by the sermon's file name without extension (timestamp_topic)."""
+    return os.path.splitext(os.path.basename(sermon_file))[0]
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def sync_sermons(data_dir="data", videos_dir="videos", db_path=JOB_DB_PATH):
+    """Register sermon files that are not in the store yet.
+
+    The directory is only listed when its mtime changed since the last sync, so an
+    unchanged backlog costs a single stat. Newly seen sermons that already have a video
+    (from before the store existed) are recorded as done. Also resets "running" jobs
+    whose process is gone to "failed" so they are picked up again.
+    """
+    with _transaction(db_path) as conn:
+        for row in conn.execute("SELECT job_id, pid FROM jobs WHERE status = ?", (RUNNING,)).fetchall():
+            if not row["pid"] or not _pid_alive(row["pid"]):
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                    (FAILED, "interrupted", _now(), row["job_id"])
+                )
+
+        data_mtime = str(os.stat(data_dir).st_mtime_ns)
+        row = conn.execute("SELECT value FROM meta WHERE key = 'data_mtime'").fetchone()
+        if row and row["value"] == data_mtime:
+            return 0
+
+        known = {r["job_id"] for r in conn.execute("SELECT job_id FROM jobs")}
+        new_files = [
+            f for f in os.listdir(data_dir)
+            if f.endswith(".txt") and get_job_id(f) not in known
+        ]
+        if new_files:
+            # Match videos by the sermon's timestamp prefix, as the directory diff did
+            rendered = set()
+            if os.path.isdir(videos_dir):
+                rendered = {'_'.join(v.split('_')[:2]) for v in os.listdir(videos_dir) if v.endswith(".mp4")}
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs (job_id, sermon_file, status, updated_at) VALUES (?, ?, ?, ?)",
+                [
+                    (get_job_id(f), os.path.join(data_dir, f),
+                     DONE if '_'.join(f.split('_')[:2]) in rendered else PENDING, _now())
+                    for f in new_files
+                ]
+            )
+            logger.info(f"Registered {len(new_files)} new sermons")
+
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('data_mtime', ?)", (data_mtime,))
+        return len(new_files)
+
+def register_sermon(sermon_file, db_path=JOB_DB_PATH):
+    """Add a sermon to the store as pending (no-op if it is already known)."""
+    with _transaction(db_path) as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO jobs (job_id, sermon_file, status, updated_at) VALUES (?, ?, ?, ?)",
+            (get_job_id(sermon_file), sermon_file, PENDING, _now())
+        )
+
+def get_pending_sermons(include_failed=True, db_path=JOB_DB_PATH):
+    """Sermon files still to be processed, oldest first, via the status index."""
+    statuses = (PENDING, FAILED) if include_failed else (PENDING,)
+    with _transaction(db_path) as conn:
+        rows = conn.execute(
+            f"SELECT sermon_file FROM jobs WHERE status IN ({','.join('?' * len(statuses))}) ORDER BY job_id",
+            statuses
+        ).fetchall()
+    return [row["sermon_file"] for row in rows]
+
+def get_job(job_id, db_path=JOB_DB_PATH):
+    """Return a job as a dict (artifacts decoded), or None."""
+    with _transaction(db_path) as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(row)
+    job["artifacts"] = json.loads(job["artifacts"])
+    return job
+
+def mark_running(job_id, db_path=JOB_DB_PATH):
+    """Claim a pending or failed job for this process.
+
+    Returns:
+        bool: False if the job is unknown, done, or already claimed by another run.
+    """
+    with _transaction(db_path) as conn:
+        cursor = conn.execute(
+            "UPDATE jobs SET status = ?, pid = ?, error = NULL, attempts = attempts + 1, updated_at = ? "
+            "WHERE job_id = ? AND status IN (?, ?)",
+            (RUNNING, os.getpid(), _now(), job_id, PENDING, FAILED)
+        )
+        return cursor.rowcount > 0
+
+def mark_stage(job_id, stage, artifact=None, db_path=JOB_DB_PATH):
+    """Record that a stage finished, along with the file it produced."""
+    with _transaction(db_path) as conn:
+        row = conn.execute("SELECT artifacts FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        artifacts = json.loads(row["artifacts"]) if row else {}
+        artifacts[stage] = artifact
+        conn.execute(
+            "UPDATE jobs SET stage = ?, artifacts = ?, updated_at = ? WHERE job_id = ?",
+            (stage, json.dumps(artifacts), _now(), job_id)
+        )
+
+def mark_done(job_id, video_path, db_path=JOB_DB_PATH):
+    mark_stage(job_id, "video", video_path, db_path)
+    with _transaction(db_path) as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, pid = NULL, updated_at = ? WHERE job_id = ?",
+            (DONE, _now(), job_id)
+        )
+
+def mark_failed(job_id, error, db_path=JOB_DB_PATH, status=FAILED):
+    """Record a job's error. Failed jobs are retried on the next run; pass status=INVALID
+    for sermons that can never be processed."""
+    with _transaction(db_path) as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, pid = NULL, updated_at = ? WHERE job_id = ?",
+            (status, error, _now(), job_id)
+        )
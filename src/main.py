@@ -1,11 +1,33 @@
 import os
 import shutil
+import argparse
+import multiprocessing
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 import logging
-from sermon_generator import generate_sermon, BIBLICAL_TOPICS
-from create_captioned_videos import create_video_with_subtitles
-from audio_utils import text_to_audio, mix_audio
+from sermon_generator import (
+    generate_sermons, stream_sermon, save_sermon, create_sermon_prompt, pick_topics, new_usage, format_usage,
+    BIBLICAL_TOPICS
+)
+from create_captioned_videos import (
+    create_video_with_subtitles, get_library_background, SUBTITLE_MODES, SUBTITLE_OUTPUTS, ENCODING_PROFILES
+)
+from background_library import SELECTION_POLICIES
+from audio_utils import (
+    text_to_audio, synthesize_chunks, mix_audio,
+    TTS_MODEL, TTS_VOICE, TTS_SPEED, TTS_INSTRUCTIONS, TTS_CHUNK_SIZE
+)
+from music_bed import MUSIC_POLICIES, pick_music_track, get_policy_tracks, music_bed_key, prepare_music_bed
+from checkpoints import stage_key, hash_file, load_checkpoint, save_checkpoint
+from workspace import get_job_workspace, cleanup_job_workspace, move_job_workspace
+from ffmpeg_runner import set_thread_limit
+from instrumentation import start_run, measure, load_events, format_summary
+from job_store import (
+    get_job_id, sync_sermons, register_sermon, get_pending_sermons, mark_running, mark_stage, mark_done, mark_failed,
+    INVALID
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -18,124 +40,439 @@ def setup_directories():
         os.makedirs(directory, exist_ok=True)
         logger.info(f"Created/verified directory: {directory}")
 
-def cleanup_temp_files():
-    """Clean up temporary files while keeping specified files."""
-    try:
-        # Clean up temp directory
-        if os.path.exists('temp'):
-            shutil.rmtree('temp')
-            logger.info("Cleaned up temp directory")
+def get_unprocessed_sermons():
+    """Get list of sermons that haven't been processed into videos yet.
 
-        # Clean up processed_audio
-        if os.path.exists('processed_audio'):
-            shutil.rmtree('processed_audio')
-            logger.info("Cleaned up processed_audio directory")
+    New files in data/ are registered in the job store (only when the directory
+    changed), then pending and failed jobs are read from its status index.
+    """
+    sync_sermons('data', 'videos')
+    return get_pending_sermons()
 
-        logger.info("Cleanup completed successfully")
-    except Exception as e:
-        logger.error(f"Error during cleanup: {str(e)}")
+def get_stage_limits(workers, tts_workers=None, image_workers=None, render_workers=None):
+    """Resolve the concurrency limit of each pipeline stage.
 
-def get_unprocessed_sermons():
-    """Get list of sermons that haven't been processed into videos yet."""
-    # Get all sermon files
-    sermon_files = [f for f in os.listdir('data') if f.endswith('.txt')]
-    
-    # Get all existing video files
-    video_files = set(os.path.splitext(f)[0] for f in os.listdir('videos') if f.endswith('.mp4'))
-    
-    # Filter out sermons that already have videos
-    unprocessed = []
+    `workers` is the default for every stage; render workers are additionally capped
+    at the number of CPU cores since each one runs Whisper and x264.
+    """
+    workers = max(1, workers)
+    return {
+        'tts': tts_workers or workers,
+        'image': image_workers or workers,
+        'render': render_workers or min(workers, os.cpu_count() or 1),
+    }
+
+def get_timing_path(workdir):
+    """Where the voice stage records chunk timings for text-based subtitles."""
+    return os.path.join(workdir, 'chunk_timings.json')
+
+# Per-run rendering options carried by every job; also the command line defaults
+DEFAULT_JOB_OPTIONS = {
+    'subtitle_mode': 'text',
+    'encoding_profile': 'fast',
+    'crf': None,  # None keeps the profile's CRF
+    'subtitle_output': 'burn',
+    'background_policy': 'least_used',
+    'music_policy': 'default',
+    'use_base_clip': False,
+    'single_pass': False,
+}
+
+def make_job(sermon_file, options=None):
+    """Describe the work for one sermon file."""
+    # Extract topic from filename
+    topic = os.path.basename(sermon_file).split('_', 2)[2].replace('.txt', '')
+    timestamp = '_'.join(os.path.basename(sermon_file).split('_')[:2])
+    base_name = f"{timestamp}_{topic}"
+    return {
+        **DEFAULT_JOB_OPTIONS,
+        **(options or {}),
+        'sermon_file': sermon_file,
+        'topic': topic,
+        'timestamp': timestamp,
+        'base_name': base_name,
+        # Scratch files for this sermon live in their own workspace
+        'job_id': base_name,
+    }
+
+def _file_hashes(artifact):
+    """Content hashes of a stage artifact (a path or a list of paths)."""
+    paths = artifact if isinstance(artifact, list) else [artifact]
+    return [hash_file(path) for path in paths]
+
+def get_voice_key(job, sermon_text):
+    """Checkpoint key of the voice stage: the text and every TTS setting."""
+    return stage_key(sermon_text, TTS_MODEL, TTS_VOICE, TTS_SPEED, TTS_INSTRUCTIONS, TTS_CHUNK_SIZE,
+                     job['single_pass'])
+
+def generate_voiced_sermon(options=None, topic=None):
+    """Generate a new sermon and voice it while the text is still streaming in.
+
+    Sentences from stream_sermon go straight to the TTS chunker, so the first chunks are
+    synthesized while the model is still writing. Once the sermon is saved, the audio
+    becomes the new job's voice checkpoint, and the voice stage of run_pipeline reuses it.
+    Args:
+        options (dict, optional): Job options, as passed to run_pipeline.
+        topic (str, optional): Sermon topic. Defaults to a random one.
+    Returns:
+        str: The saved sermon file, or None if generation failed.
+    """
+    options = {**DEFAULT_JOB_OPTIONS, **(options or {})}
+    topic = topic or pick_topics(1)[0]
+    prompt = create_sermon_prompt(topic, BIBLICAL_TOPICS[topic])
+    usage = new_usage()
+    pieces = []
+    finished = []
+
+    def sermon_text():
+        for piece in stream_sermon(prompt, usage=usage):
+            pieces.append(piece)
+            yield piece
+        finished.append(True)
+
+    # The job ID comes from the file name, which only exists once the sermon is saved
+    scratch_id = f"streaming_{os.getpid()}"
+    cleanup_job_workspace(scratch_id)
+    workdir = get_job_workspace(scratch_id)
+    voice = None
+    with measure('sermon_stream', topic=topic) as event:
+        if options['single_pass']:
+            try:
+                voice = synthesize_chunks(sermon_text(), workdir, timing_path=get_timing_path(workdir),
+                                          require_timings=True)
+            except Exception as e:
+                logger.error(f"Failed to create voice audio chunks: {str(e)}")
+        elif text_to_audio(sermon_text(), os.path.join(workdir, "voice.mp3"), workdir=workdir,
+                           timing_path=get_timing_path(workdir)):
+            voice = os.path.join(workdir, "voice.mp3")
+        event.update(prompt_tokens=usage['prompt_tokens'], completion_tokens=usage['completion_tokens'],
+                     cost=usage['cost'], ok=bool(finished and voice))
+    logger.info(f"Sermon usage: {format_usage(usage)}")
+
+    content = "".join(pieces).strip()
+    if not finished or not content:
+        logger.error("Sermon generation failed")
+        cleanup_job_workspace(scratch_id)
+        return None
+    sermon_file = save_sermon(content, topic)
+    if not voice:
+        # The text is complete; the pipeline's voice stage synthesizes it again
+        cleanup_job_workspace(scratch_id)
+        return sermon_file
+
+    job = make_job(sermon_file, options)
+    workdir = move_job_workspace(scratch_id, job['job_id'])
+    timing_path = get_timing_path(workdir)
+    if options['single_pass']:
+        voice = [os.path.abspath(os.path.join(workdir, os.path.basename(path))) for path in voice]
+        files = voice + [timing_path]
+    else:
+        voice_path = os.path.join(workdir, f"voice_{job['base_name']}.mp3")
+        os.replace(os.path.join(workdir, "voice.mp3"), voice_path)
+        voice = voice_path
+        files = [voice_path, timing_path]
+    save_checkpoint(workdir, 'voice', get_voice_key(job, content), voice, files=files)
+    return sermon_file
+
+def synthesize_voice(job):
+    """Network stage: convert the sermon text to a voice track.
+
+    Returns the voice file, or for single-pass jobs the list of TTS chunk files, or None.
+    """
+    logger.info(f"Processing sermon: {os.path.basename(job['sermon_file'])}")
+
+    # Read sermon content
+    with open(job['sermon_file'], 'r', encoding='utf-8') as f:
+        sermon_text = f.read()
+
+    workdir = get_job_workspace(job['job_id'])
+    timing_path = get_timing_path(workdir)
+
+    # Skip synthesis if an earlier run already voiced this exact text with these settings
+    key = get_voice_key(job, sermon_text)
+    voice = load_checkpoint(workdir, 'voice', key)
+    if voice:
+        logger.info(f"Voice checkpoint is up to date, skipping TTS: {job['job_id']}")
+        return voice
+
+    if job['single_pass']:
+        # Keep the chunks; the render joins them in the same FFmpeg pass as the video
+        try:
+            # The render has no mixed file to run Whisper on, so the timings are required
+            voice = synthesize_chunks(sermon_text, workdir, timing_path=timing_path, require_timings=True)
+        except Exception as e:
+            logger.error(f"Failed to create voice audio chunks: {str(e)}")
+            return None
+        save_checkpoint(workdir, 'voice', key, voice, files=voice + [timing_path])
+        return voice
+
+    # Create voice audio file
+    voice_path = os.path.join(workdir, f"voice_{job['base_name']}.mp3")
+
+    if not text_to_audio(sermon_text, voice_path, workdir=workdir, timing_path=timing_path):
+        logger.error("Failed to create voice audio file")
+        return None
+    save_checkpoint(workdir, 'voice', key, voice_path, files=[voice_path, timing_path])
+    return voice_path
+
+def generate_background(job):
+    """Network stage: pick a library background, generating one if needed. Returns the path or None."""
+    workdir = get_job_workspace(job['job_id'])
+    key = stage_key(job['topic'], job['background_policy'])
+    background_path = load_checkpoint(workdir, 'background', key)
+    if background_path:
+        logger.info(f"Background checkpoint is up to date: {background_path}")
+        return background_path
+
+    background_path = get_library_background(job['topic'], job['background_policy'])
+    if background_path:
+        save_checkpoint(workdir, 'background', key, background_path)
+    return background_path
+
+def render_video(job, voice_path, background_path):
+    """CPU stage: mix the voice with music and render the captioned video.
+
+    Mixing and the final render are each skipped when their checkpoint matches the
+    current inputs; subtitles are checkpointed inside create_video_with_subtitles.
+    """
+    workdir = get_job_workspace(job['job_id'])
+    music_track = pick_music_track(job['music_policy'], job['job_id'])
+    # Identifies the track and the bed settings without hashing the decoded bed
+    music_key = music_bed_key(music_track)
+    music_path = None
+    if job['single_pass']:
+        # voice_path is the list of chunks; music is mixed during the render
+        audio_path = voice_path
+        music_path = prepare_music_bed(music_track) if music_track else None
+    else:
+        # Mix audio with background music
+        audio_path = os.path.join(workdir, f"{job['base_name']}.mp3")
+        mix_key = stage_key(_file_hashes(voice_path), music_key)
+        if load_checkpoint(workdir, 'mix', mix_key):
+            logger.info("Mixed audio checkpoint is up to date, skipping mix")
+        else:
+            logger.info(f"Mixing audio with background music {music_track}...")
+            if mix_audio(voice_path, audio_path, music_track, fallback_to_voice=False):
+                save_checkpoint(workdir, 'mix', mix_key, audio_path)
+            else:
+                # Not checkpointed: mix_key names the music, and the next run tries it again
+                logger.warning("Could not mix background music, using the voice track only")
+                shutil.copy2(voice_path, audio_path)
+
+    # Create video with subtitles; fall back to the default background if none is available.
+    # Library backgrounds are shared between videos, so they are never deleted here.
+    video_output = os.path.join('videos', f"{job['base_name']}.mp4")
+    video_key = stage_key(
+        _file_hashes(audio_path), music_key if music_path else None, hash_file(background_path),
+        hash_file(get_timing_path(workdir)), job['subtitle_mode'], job['encoding_profile'],
+        job['crf'], job['subtitle_output'], job['use_base_clip']
+    )
+    if load_checkpoint(workdir, 'video', video_key):
+        logger.info(f"Video checkpoint is up to date, skipping render: {video_output}")
+        return video_output
+
+    if not create_video_with_subtitles(audio_path, video_output, use_generated_bg=False,
+                                       base_name=job['base_name'], background_path=background_path,
+                                       workdir=workdir, subtitle_mode=job['subtitle_mode'],
+                                       timing_path=get_timing_path(workdir),
+                                       encoding_profile=job['encoding_profile'],
+                                       crf=job['crf'],
+                                       subtitle_output=job['subtitle_output'],
+                                       use_base_clip=job['use_base_clip'],
+                                       music_path=music_path):
+        logger.error("Failed to create video")
+        return None
+
+    save_checkpoint(workdir, 'video', video_key, video_output)
+    return video_output
+
+def run_stage(stage, func, job, *args):
+    """Run a job's pipeline stage under instrumentation; nested stages inherit the job id."""
+    with measure(stage, job_id=job['job_id']) as event:
+        result = func(job, *args)
+        event['ok'] = bool(result)
+        return result
+
+def run_pipeline(sermon_files, stage_limits, options=None):
+    """Drive every sermon through the staged pipeline.
+
+    TTS and background generation for a sermon run concurrently in their own thread
+    pools; as soon as both finish the sermon is handed to the render process pool, so
+    network and CPU work for different sermons overlap. Returns the created video paths.
+    Args:
+        options (dict, optional): Overrides for DEFAULT_JOB_OPTIONS.
+    """
+    jobs = []
     for sermon_file in sermon_files:
-        sermon_id = '_'.join(sermon_file.split('_')[:2])  # Get timestamp part of filename
-        if not any(video.startswith(sermon_id) for video in video_files):
-            unprocessed.append(os.path.join('data', sermon_file))
-    
-    return unprocessed
+        # A badly named file fails on its own instead of aborting the run
+        try:
+            jobs.append(make_job(sermon_file, options))
+        except Exception as e:
+            logger.error(f"Error processing sermon {sermon_file}: {str(e)}")
+            mark_failed(get_job_id(sermon_file), f"invalid sermon file: {str(e)}", status=INVALID)
+    logger.info(f"Stage limits: {stage_limits}")
+
+    created = []
+    # Render workers are spawned rather than forked: a fork taken while the TTS and image
+    # threads hold a lock (logging, instrumentation) would inherit it held and deadlock
+    render_context = multiprocessing.get_context('spawn')
+    with ThreadPoolExecutor(max_workers=stage_limits['tts'], thread_name_prefix='tts') as tts_pool, \
+         ThreadPoolExecutor(max_workers=stage_limits['image'], thread_name_prefix='image') as image_pool, \
+         ProcessPoolExecutor(max_workers=stage_limits['render'], mp_context=render_context) as render_pool:
+        futures = {}
+        for job in jobs:
+            if not mark_running(job['job_id']):
+                logger.info(f"Skipping {job['sermon_file']}: already claimed by another run")
+                continue
+            futures[tts_pool.submit(run_stage, 'voice', synthesize_voice, job)] = (job, 'voice')
+            futures[image_pool.submit(run_stage, 'background', generate_background, job)] = (job, 'background')
+
+        artifacts = {}
+        outstanding = set(futures)
+        while outstanding:
+            done, outstanding = wait(outstanding, return_when=FIRST_COMPLETED)
+            for future in done:
+                job, stage = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Error in {stage} stage for {job['sermon_file']}: {str(e)}")
+                    result = None
+
+                if stage == 'video':
+                    if result:
+                        logger.info(f"Successfully created video: {result}")
+                        created.append(result)
+                        mark_done(job['job_id'], result)
+                        # Failed jobs keep their workspace for inspection; it is reused on rerun
+                        cleanup_job_workspace(job['job_id'])
+                    else:
+                        mark_failed(job['job_id'], "render failed")
+                    continue
+
+                if result:
+                    mark_stage(job['job_id'], stage, result)
+                job_artifacts = artifacts.setdefault(job['base_name'], {})
+                job_artifacts[stage] = result
+                if 'voice' not in job_artifacts or 'background' not in job_artifacts:
+                    continue
+
+                del artifacts[job['base_name']]
+                if not job_artifacts['voice']:
+                    mark_failed(job['job_id'], "voice synthesis failed")
+                    continue
+                try:
+                    render = render_pool.submit(run_stage, 'video', render_video, job,
+                                                job_artifacts['voice'], job_artifacts['background'])
+                except BrokenProcessPool as e:
+                    # A render worker died (e.g. killed for memory); the pool takes no more work
+                    logger.error(f"Render pool is broken, cannot render {job['sermon_file']}: {str(e)}")
+                    mark_failed(job['job_id'], "render pool broken")
+                    continue
+                futures[render] = (job, 'video')
+                outstanding.add(render)
+
+    return created
 
-def main():
+def parse_args(argv=None):
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Automated sermon video creation workflow")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Default concurrency limit for every pipeline stage (default: 1)")
+    parser.add_argument('--tts-workers', type=int, help="Concurrent text-to-speech jobs")
+    parser.add_argument('--image-workers', type=int, help="Concurrent background image generations")
+    parser.add_argument('--render-workers', type=int,
+                        help="Render processes for mixing, transcription and encoding (default: min(workers, CPUs))")
+    parser.add_argument('--subtitles', choices=SUBTITLE_MODES, default=DEFAULT_JOB_OPTIONS['subtitle_mode'],
+                        help="Time captions from the sermon text and TTS chunk durations ('text'), "
+                             "or transcribe the audio with Whisper ('whisper'). Text mode falls back "
+                             "to Whisper if the timings are unavailable (default: %(default)s)")
+    parser.add_argument('--profile', choices=sorted(ENCODING_PROFILES), default=DEFAULT_JOB_OPTIONS['encoding_profile'],
+                        help="Video encoding profile; 'fast' and 'draft' render the still background "
+                             "at 1-2 fps with a faster x264 preset (default: %(default)s)")
+    parser.add_argument('--crf', type=int, default=DEFAULT_JOB_OPTIONS['crf'],
+                        help="Override the encoding profile's x264 CRF (lower is higher quality); "
+                             "not applied to stream-copied --base-clips")
+    parser.add_argument('--subtitle-output', choices=SUBTITLE_OUTPUTS, default=DEFAULT_JOB_OPTIONS['subtitle_output'],
+                        help="Burn captions into the video, mux them as a soft mov_text track, "
+                             "or write an .srt sidecar next to the MP4 (default: %(default)s)")
+    parser.add_argument('--background-policy', choices=SELECTION_POLICIES,
+                        default=DEFAULT_JOB_OPTIONS['background_policy'],
+                        help="How to pick a background from the library once it is full; "
+                             "'new' always generates a new image (default: %(default)s)")
+    parser.add_argument('--music-policy', choices=MUSIC_POLICIES, default=DEFAULT_JOB_OPTIONS['music_policy'],
+                        help="Mix the default track under every sermon, or spread the tracks in "
+                             "assets/music over the sermons (default: %(default)s)")
+    parser.add_argument('--base-clips', action='store_true',
+                        help="Loop a cached pre-encoded clip of the background instead of encoding video "
+                             "(requires --subtitle-output soft or sidecar)")
+    parser.add_argument('--single-pass', action='store_true',
+                        help="Join the TTS chunks, mix the music and render the video in one FFmpeg pass "
+                             "with no intermediate audio files (requires --subtitles text)")
+    parser.add_argument('--generate', type=int, default=0, metavar='N',
+                        help="Generate N new sermons concurrently before processing the backlog")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Main execution function that orchestrates the entire workflow."""
+    args = parse_args(argv)
     try:
         logger.info("Starting automated sermon video creation workflow...")
-        
+        events_path = start_run()
+        logger.info(f"Recording stage metrics to {events_path}")
+
         # Setup required directories
         setup_directories()
-        
+
+        if args.generate:
+            logger.info(f"Generating {args.generate} sermons...")
+            generate_sermons(args.generate, on_saved=register_sermon)
+
+        stage_limits = get_stage_limits(args.workers, args.tts_workers, args.image_workers, args.render_workers)
+        # Concurrent renders split the CPUs rather than each running a thread per core
+        threads = set_thread_limit(stage_limits['render'])
+        logger.info(f"FFmpeg threads per render: {threads}")
+        single_pass = args.single_pass
+        if single_pass and args.subtitles != 'text':
+            logger.warning("--single-pass needs --subtitles text; rendering from a mixed audio file instead")
+            single_pass = False
+        options = {
+            'subtitle_mode': args.subtitles,
+            'encoding_profile': args.profile,
+            'crf': args.crf,
+            'subtitle_output': args.subtitle_output,
+            'background_policy': args.background_policy,
+            'music_policy': args.music_policy,
+            'use_base_clip': args.base_clips,
+            'single_pass': single_pass,
+        }
+
         # Get unprocessed sermons
         unprocessed_sermons = get_unprocessed_sermons()
-        
+
         if not unprocessed_sermons:
-            logger.info("No unprocessed sermons found. Generating a new sermon...")
-            new_sermon_file = generate_sermon()
+            logger.info("No unprocessed sermons found. Generating a new sermon and voicing it as it streams...")
+            new_sermon_file = generate_voiced_sermon(options)
             if new_sermon_file:
                 logger.info(f"Generated new sermon: {new_sermon_file}")
+                register_sermon(new_sermon_file)
                 unprocessed_sermons = [new_sermon_file]
             else:
                 logger.error("Failed to generate new sermon")
                 return
-        
+
         logger.info(f"Found {len(unprocessed_sermons)} sermons to process")
-        
-        for sermon_file in unprocessed_sermons:
-            try:
-                logger.info(f"Processing sermon: {os.path.basename(sermon_file)}")
-                
-                # Extract topic from filename
-                topic = os.path.basename(sermon_file).split('_', 2)[2].replace('.txt', '')
-                timestamp = '_'.join(os.path.basename(sermon_file).split('_')[:2])
-                
-                # Read sermon content
-                with open(sermon_file, 'r', encoding='utf-8') as f:
-                    sermon_text = f.read()
-                
-                # Create voice audio file
-                voice_path = os.path.join('temp', f'voice_{timestamp}_{topic}.mp3')
-                os.makedirs('temp', exist_ok=True)
-                
-                if not text_to_audio(sermon_text, voice_path):
-                    logger.error("Failed to create voice audio file")
-                    continue
-                
-                # Mix audio with background music
-                logger.info("Mixing audio with background music...")
-                audio_path = os.path.join('processed_audio', f'{timestamp}_{topic}.mp3')
-                os.makedirs('processed_audio', exist_ok=True)
-                
-                if not mix_audio(voice_path, audio_path):
-                    logger.error("Failed to mix audio")
-                    continue
-                
-                # Create video with subtitles
-                video_output = os.path.join('videos', f'{timestamp}_{topic}.mp4')
-                if not create_video_with_subtitles(audio_path, video_output, use_generated_bg=True, base_name=f"{timestamp}_{topic}"):
-                    logger.error("Failed to create video")
-                    continue
-                
-                # Move the background image to match video name if it exists
-                background_files = [f for f in os.listdir('backgrounds') if f.startswith('background_')]
-                if background_files:
-                    latest_background = max(background_files, key=lambda x: os.path.getctime(os.path.join('backgrounds', x)))
-                    new_background_name = f'{timestamp}_{topic}_background.png'
-                    os.rename(
-                        os.path.join('backgrounds', latest_background),
-                        os.path.join('backgrounds', new_background_name)
-                    )
-                
-                # Clean up temporary files for this sermon
-                cleanup_temp_files()
-                
-                logger.info(f"Successfully created video: {video_output}")
-                
-            except Exception as e:
-                logger.error(f"Error processing sermon {sermon_file}: {str(e)}")
-                # Continue with next sermon
-                continue
-        
+        # Prepare the music beds once, before render workers could race to do it
+        for track in get_policy_tracks(args.music_policy):
+            prepare_music_bed(track)
+        created = run_pipeline(unprocessed_sermons, stage_limits, options)
+        logger.info(f"Created {len(created)} of {len(unprocessed_sermons)} videos")
+
         logger.info("Workflow completed successfully!")
-        
+        logger.info("Stage summary:\n" + format_summary(load_events(events_path)))
+
     except Exception as e:
         logger.error(f"Error in main workflow: {str(e)}")
-        # Attempt cleanup even if there's an error
-        cleanup_temp_files()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,171 @@
+"""Loudness-normalized, loop-ready music beds prepared once per track.
+
+A bed is a music track decoded to PCM WAV, with its end crossfaded into its start so
+it loops without a seam under `-stream_loop -1`, and normalized with FFmpeg's two-pass
+EBU R128 loudnorm to MUSIC_BED_LUFS: the level it sits at under the voice. Beds are
+cached in MUSIC_CACHE_DIR keyed on the track's content hash and the target loudness,
+so each job only reads a bed instead of decoding and leveling the track again.
+"""
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from checkpoints import hash_file, stage_key
+from instrumentation import measure, get_file_size
+from ffmpeg_runner import run_ffmpeg, probe_duration
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MUSIC_DIR = "assets/music"
+DEFAULT_BACKGROUND_MUSIC = os.path.join(MUSIC_DIR, "ambient_worship.mp3")
+MUSIC_EXTENSIONS = (".mp3", ".wav", ".flac", ".ogg", ".m4a", ".aac")
+MUSIC_CACHE_DIR = os.getenv("MUSIC_CACHE_DIR", "cache/music")
+
+# Integrated loudness of the bed; about 20 dB under the TTS voice, like the old volume=0.1
+MUSIC_BED_LUFS = float(os.getenv("MUSIC_BED_LUFS", "-36"))
+MUSIC_BED_TRUE_PEAK = -2.0
+MUSIC_BED_LRA = 11.0
+MUSIC_BED_SAMPLE_RATE = 44100
+LOOP_CROSSFADE = 3.0  # Seconds of the track's end blended into its start
+
+# "default" always uses DEFAULT_BACKGROUND_MUSIC; "per_job" spreads the tracks over jobs
+MUSIC_POLICIES = ("default", "per_job")
+
+def list_music_tracks(music_dir=MUSIC_DIR):
+    """Audio files in the music directory, sorted by name."""
+    if not os.path.isdir(music_dir):
+        return []
+    return sorted(
+        os.path.join(music_dir, name) for name in os.listdir(music_dir)
+        if name.lower().endswith(MUSIC_EXTENSIONS)
+    )
+
+def pick_music_track(policy="default", seed=None, music_dir=MUSIC_DIR):
+    """Choose the music track for a job, or None if there is none.
+    Args:
+        policy (str): One of MUSIC_POLICIES.
+        seed (str, optional): Job id for "per_job"; the same job always gets the same
+            track, so reruns hit its checkpoints.
+    """
+    tracks = list_music_tracks(music_dir)
+    if not tracks:
+        return None
+    if policy == "per_job" and seed is not None:
+        digest = hashlib.sha256(str(seed).encode("utf-8")).hexdigest()
+        return tracks[int(digest, 16) % len(tracks)]
+    return DEFAULT_BACKGROUND_MUSIC if DEFAULT_BACKGROUND_MUSIC in tracks else tracks[0]
+
+def get_policy_tracks(policy="default", music_dir=MUSIC_DIR):
+    """Every track a policy may pick, so their beds can be prepared up front."""
+    if policy == "per_job":
+        return list_music_tracks(music_dir)
+    track = pick_music_track(policy, music_dir=music_dir)
+    return [track] if track else []
+
+def music_bed_key(track, target_lufs=MUSIC_BED_LUFS):
+    """Cache key of a track's bed: its content hash and the bed settings. None if it is missing."""
+    digest = hash_file(track)
+    if digest is None:
+        return None
+    return stage_key(digest, target_lufs, MUSIC_BED_TRUE_PEAK, MUSIC_BED_LRA, MUSIC_BED_SAMPLE_RATE, LOOP_CROSSFADE)
+
+def get_music_bed_path(key, cache_dir=MUSIC_CACHE_DIR):
+    return os.path.join(cache_dir, f"{key}.wav")
+
+def _bed_filter(duration, loudnorm):
+    """Filter graph from input 0 to [bed]: crossfade the loop point, then loudnorm."""
+    decode = f"[0:a]aformat=sample_rates={MUSIC_BED_SAMPLE_RATE}:channel_layouts=stereo"
+    if duration is None or duration <= 2 * LOOP_CROSSFADE:
+        loop = f"{decode}[loop]"
+    else:
+        # The bed starts LOOP_CROSSFADE into the track and ends by fading into the track's
+        # first LOOP_CROSSFADE seconds, so its end runs straight on into its start
+        loop = (
+            f"{decode},asplit[body][head];"
+            f"[body]atrim=start={LOOP_CROSSFADE},asetpts=PTS-STARTPTS[tail];"
+            f"[head]atrim=end={LOOP_CROSSFADE},asetpts=PTS-STARTPTS[intro];"
+            f"[tail][intro]acrossfade=d={LOOP_CROSSFADE}[loop]"
+        )
+    # loudnorm resamples to 192 kHz internally
+    return f"{loop};[loop]{loudnorm},aresample={MUSIC_BED_SAMPLE_RATE}[bed]"
+
+def _loudnorm_options(target_lufs):
+    return f"loudnorm=I={target_lufs}:TP={MUSIC_BED_TRUE_PEAK}:LRA={MUSIC_BED_LRA}"
+
+def _measure_loudness(track, duration, target_lufs):
+    """First loudnorm pass: the track's measured loudness as reported by FFmpeg."""
+    ffmpeg_args = [
+        "-i", track,
+        "-filter_complex", _bed_filter(duration, f"{_loudnorm_options(target_lufs)}:print_format=json"),
+        "-map", "[bed]", "-f", "null",
+    ]
+    result = run_ffmpeg(ffmpeg_args, "-", duration=duration, label="music loudness")
+    if result.returncode != 0:
+        raise RuntimeError(f"FFmpeg error measuring loudness: {result.stderr}")
+    # The measurements are the last thing loudnorm prints
+    start, end = result.stderr.rfind("{"), result.stderr.rfind("}")
+    if start == -1 or end < start:
+        raise RuntimeError("FFmpeg reported no loudness measurements")
+    return json.loads(result.stderr[start:end + 1])
+
+def prepare_music_bed(track, target_lufs=MUSIC_BED_LUFS, cache_dir=MUSIC_CACHE_DIR):
+    """Return the cached bed of a track, preparing it first if needed.
+    Args:
+        track (str): Music file to prepare.
+        target_lufs (float): Integrated loudness of the bed.
+        cache_dir (str): Where prepared beds are kept.
+    Returns:
+        str: Path of the bed (a WAV file), or None if the track is missing or preparing it failed.
+    """
+    key = music_bed_key(track, target_lufs)
+    if key is None:
+        logger.warning(f"Background music file not found: {track}")
+        return None
+
+    bed_path = get_music_bed_path(key, cache_dir)
+    if os.path.exists(bed_path):
+        return bed_path
+
+    logger.info(f"Preparing music bed for {track} at {target_lufs} LUFS...")
+    tmp_path = None
+    try:
+        with measure("music_bed", bytes_in=get_file_size(track)) as event:
+            try:
+                duration = probe_duration(track)
+            except Exception:
+                duration = None  # Only used to place the loop point and report progress
+            measured = _measure_loudness(track, duration, target_lufs)
+
+            # Second pass applies a single gain computed from the measurements
+            loudnorm = (
+                f"{_loudnorm_options(target_lufs)}:measured_I={measured['input_i']}"
+                f":measured_TP={measured['input_tp']}:measured_LRA={measured['input_lra']}"
+                f":measured_thresh={measured['input_thresh']}:offset={measured['target_offset']}:linear=true"
+            )
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".part.wav")
+            os.close(fd)
+            ffmpeg_args = [
+                "-i", track,
+                "-filter_complex", _bed_filter(duration, loudnorm),
+                "-map", "[bed]", "-c:a", "pcm_s16le", "-ar", str(MUSIC_BED_SAMPLE_RATE),
+            ]
+            result = run_ffmpeg(ffmpeg_args, tmp_path, duration=duration, label="music bed")
+            event["ok"] = result.returncode == 0
+            event["input_lufs"] = float(measured["input_i"])
+            event["bytes_out"] = get_file_size(tmp_path)
+        if result.returncode != 0:
+            logger.error(f"FFmpeg error preparing music bed: {result.stderr}")
+            return None
+        # Concurrent renders may race to prepare the same bed; either copy is fine
+        os.replace(tmp_path, bed_path)
+        logger.info(f"Prepared music bed: {bed_path} (track measured {measured['input_i']} LUFS)")
+        return bed_path
+    except Exception as e:
+        logger.error(f"Error preparing music bed: {str(e)}")
+        return None
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,332 @@
+"""Record/replay cache in front of the OpenAI client.
+
+OPENAI_CACHE_MODE selects how chat, speech and image calls are served:
+    live         Always call the API and leave the cache alone (default).
+    record       Always call the API and store every response.
+    replay       Serve from the cache only; a miss raises CacheMiss, so no request
+                 ever leaves the machine.
+    cache_first  Serve from the cache, calling the API (and recording) on a miss.
+
+Entries are keyed on the request parameters and kept in OPENAI_CACHE_DIR, with the
+least recently used evicted beyond OPENAI_CACHE_MAX_BYTES. Generated images are
+stored next to the JSON record, and replayed images point at them through a file://
+URL. Speech is kept only in the TTS cache (tts_cache), under the same key the
+synthesis stage uses, so each chunk's audio is stored once.
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from content_store import Counters, entry_path, write_entry, touch_entry, evict_lru
+from tts_cache import tts_cache_key, read_cached_audio, store_cached_audio
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+CACHE_MODES = ("live", "record", "replay", "cache_first")
+OPENAI_CACHE_MODE = os.getenv("OPENAI_CACHE_MODE", "live")
+OPENAI_CACHE_DIR = os.getenv("OPENAI_CACHE_DIR", "cache/openai")
+OPENAI_CACHE_MAX_BYTES = int(os.getenv("OPENAI_CACHE_MAX_BYTES", str(1024 ** 3)))  # 1 GB
+
+# Parameters that change how a response is delivered, not what it contains
+_DELIVERY_PARAMS = ("stream", "stream_options")
+
+# Speech requests made of only these parameters are served from the TTS cache
+_TTS_CACHE_PARAMS = {"model", "voice", "speed", "instructions", "input"}
+
+_stats = Counters("hits", "misses", "records", "evictions")
+
+class CacheMiss(Exception):
+    """A request has no recorded response and the cache is in replay mode."""
+
+def request_key(kind, params):
+    """Hash an endpoint and its request parameters into a cache key."""
+    payload = json.dumps(
+        {"kind": kind, "params": {k: v for k, v in params.items() if k not in _DELIVERY_PARAMS}},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _entry_path(key, cache_dir):
+    return entry_path(cache_dir, key, ".json")
+
+def _body_path(key, cache_dir, index=0):
+    return entry_path(cache_dir, key, f".{index}.bin")
+
+def load_entry(key, cache_dir=OPENAI_CACHE_DIR):
+    """Return a recorded response, or None."""
+    path = _entry_path(key, cache_dir)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        touch_entry(path, *(_body_path(key, cache_dir, index) for index in range(entry.get("bodies", 0))))
+    except (FileNotFoundError, ValueError):
+        _stats.add("misses")
+        return None
+    _stats.add("hits")
+    return entry
+
+def store_entry(key, kind, params, response, bodies=(), cache_dir=OPENAI_CACHE_DIR,
+                max_bytes=OPENAI_CACHE_MAX_BYTES):
+    """Record a response (and its binary bodies), then evict old entries over the size limit."""
+    try:
+        for index, body in enumerate(bodies):
+            write_entry(_body_path(key, cache_dir, index), body)
+        entry = {"kind": kind, "params": params, "response": response, "bodies": len(bodies)}
+        write_entry(_entry_path(key, cache_dir), json.dumps(entry, ensure_ascii=False, default=str).encode("utf-8"))
+        _stats.add("records")
+        evict_openai_cache(max_bytes, cache_dir)
+    except Exception as e:
+        logger.warning(f"Could not record OpenAI response: {str(e)}")
+
+def evict_openai_cache(max_bytes=OPENAI_CACHE_MAX_BYTES, cache_dir=OPENAI_CACHE_DIR):
+    """Delete least recently used entries, with their bodies, until the cache fits in max_bytes."""
+    evicted = evict_lru(cache_dir, max_bytes)
+    if evicted:
+        _stats.add("evictions", evicted)
+        logger.info(f"Evicted {evicted} recorded OpenAI responses")
+    return evicted
+
+def get_openai_cache_stats():
+    """Return a snapshot of the hit/miss/record/eviction counters for this process."""
+    return _stats.snapshot()
+
+def _speech_cache_key(params):
+    """TTS cache key of a speech request, or None if it uses parameters that key doesn't cover."""
+    if not set(params) <= _TTS_CACHE_PARAMS:
+        return None
+    return tts_cache_key(params.get("input"), params.get("model"), params.get("voice"),
+                         params.get("speed"), params.get("instructions"))
+
+def _usage_dict(usage):
+    if usage is None:
+        return None
+    return {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens,
+            "total_tokens": usage.total_tokens}
+
+def _usage_object(usage):
+    return SimpleNamespace(**usage) if usage else None
+
+class _RecordingStream:
+    """Pass a streamed chat completion through, recording it once it ends or is closed.
+
+    A stream closed early is recorded as far as it was read (flagged incomplete), which
+    is exactly what the same caller reads again on replay.
+    """
+
+    def __init__(self, stream, on_done):
+        self._stream = stream
+        self._on_done = on_done
+        self._content = []
+        self._finish_reason = None
+        self._usage = None
+        self._complete = False
+        self._recorded = False
+
+    def __iter__(self):
+        for chunk in self._stream:
+            if getattr(chunk, "usage", None):
+                self._usage = _usage_dict(chunk.usage)
+            if chunk.choices:
+                if chunk.choices[0].delta.content:
+                    self._content.append(chunk.choices[0].delta.content)
+                self._finish_reason = chunk.choices[0].finish_reason or self._finish_reason
+            yield chunk
+        self._complete = True
+        self._record()
+
+    def _record(self):
+        if not self._recorded:
+            self._recorded = True
+            self._on_done({"content": "".join(self._content), "finish_reason": self._finish_reason,
+                           "usage": self._usage, "complete": self._complete})
+
+    def close(self):
+        self._stream.close()
+        self._record()
+
+class _ReplayStream:
+    """A recorded chat completion delivered as stream chunks, a word at a time."""
+
+    def __init__(self, response, include_usage):
+        self._response = response
+        self._include_usage = include_usage
+
+    def __iter__(self):
+        for piece in re.findall(r"\s*\S+\s*", self._response["content"]):
+            delta = SimpleNamespace(content=piece, role="assistant")
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None, index=0)], usage=None)
+        if self._response["complete"]:
+            delta = SimpleNamespace(content=None, role=None)
+            finish = SimpleNamespace(delta=delta, finish_reason=self._response["finish_reason"], index=0)
+            yield SimpleNamespace(choices=[finish], usage=None)
+            if self._include_usage and self._response["usage"]:
+                yield SimpleNamespace(choices=[], usage=_usage_object(self._response["usage"]))
+
+    def close(self):
+        pass
+
+class _ReplayedSpeech:
+    """Stands in for the binary response of audio.speech.create."""
+
+    def __init__(self, content):
+        self.content = content
+
+    def read(self):
+        return self.content
+
+    def write_to_file(self, path):
+        with open(path, "wb") as f:
+            f.write(self.content)
+
+    stream_to_file = write_to_file
+
+def _replay(kind, key, entry, params, cache_dir):
+    response = entry["response"]
+    if kind == "chat":
+        if params.get("stream"):
+            include_usage = bool((params.get("stream_options") or {}).get("include_usage"))
+            return _ReplayStream(response, include_usage)
+        message = SimpleNamespace(role="assistant", content=response["content"])
+        choice = SimpleNamespace(message=message, finish_reason=response["finish_reason"], index=0)
+        return SimpleNamespace(choices=[choice], usage=_usage_object(response["usage"]))
+    if kind == "speech":
+        with open(_body_path(key, cache_dir), "rb") as f:
+            return _ReplayedSpeech(f.read())
+    if kind == "image":
+        data = [
+            SimpleNamespace(url=Path(_body_path(key, cache_dir, i)).absolute().as_uri(),
+                            revised_prompt=image.get("revised_prompt"), b64_json=None)
+            for i, image in enumerate(response["data"])
+        ]
+        return SimpleNamespace(data=data, created=response.get("created"))
+    raise ValueError(f"Unknown request kind: {kind}")
+
+def _download(url):
+    import urllib.request
+    with urllib.request.urlopen(url, timeout=60) as response:
+        return response.read()
+
+class CachedClient:
+    """Drop-in for the OpenAI client calls the pipeline makes, served per the cache mode.
+
+    The real client is only created (by calling factory) on the first request that
+    has to reach the API, so replaying needs neither network nor API key. Other
+    attributes are passed through to the real client.
+    """
+
+    def __init__(self, factory, mode=None, cache_dir=OPENAI_CACHE_DIR, max_bytes=OPENAI_CACHE_MAX_BYTES,
+                 is_async=False):
+        self.mode = mode or OPENAI_CACHE_MODE
+        if self.mode not in CACHE_MODES:
+            raise ValueError(f"Unknown OpenAI cache mode: {self.mode}")
+        self._factory = factory
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+        self._is_async = is_async
+        self.chat = SimpleNamespace(completions=SimpleNamespace(
+            create=lambda **params: self._serve("chat", params)))
+        self.audio = SimpleNamespace(speech=SimpleNamespace(
+            create=lambda **params: self._serve("speech", params)))
+        self.images = SimpleNamespace(
+            generate=lambda **params: self._serve("image", params))
+
+    def get_client(self):
+        """The underlying OpenAI client, created on first use."""
+        with self._client_lock:
+            if self._client is None:
+                self._client = self._factory()
+            return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get_client(), name)
+
+    def close(self):
+        if self._client is not None:
+            return self._client.close()
+        if self._is_async:
+            return _noop()
+
+    def _endpoint(self, kind):
+        client = self.get_client()
+        return {
+            "chat": client.chat.completions.create,
+            "speech": client.audio.speech.create,
+            "image": client.images.generate,
+        }[kind]
+
+    def _lookup(self, kind, params):
+        """Return (key, recorded response or None); raises CacheMiss in replay mode."""
+        key = request_key(kind, params)
+        if self.mode in ("replay", "cache_first"):
+            speech_key = _speech_cache_key(params) if kind == "speech" else None
+            if speech_key:
+                audio = read_cached_audio(speech_key)
+                _stats.add("misses" if audio is None else "hits")
+                if audio is not None:
+                    return key, _ReplayedSpeech(audio)
+            else:
+                entry = load_entry(key, self._cache_dir)
+                if entry is not None:
+                    return key, _replay(kind, key, entry, params, self._cache_dir)
+            if self.mode == "replay":
+                raise CacheMiss(f"No recorded {kind} response for request {key[:12]}")
+        return key, None
+
+    def _serve(self, kind, params):
+        if self.mode == "live":
+            return self._endpoint(kind)(**params)
+        if self._is_async:
+            return self._serve_async(kind, params)
+        key, replayed = self._lookup(kind, params)
+        if replayed is not None:
+            return replayed
+        return self._record(kind, key, params, self._endpoint(kind)(**params))
+
+    async def _serve_async(self, kind, params):
+        key, replayed = self._lookup(kind, params)
+        if replayed is not None:
+            return replayed
+        response = await self._endpoint(kind)(**params)
+        if kind == "chat" and params.get("stream"):
+            # Async streams are passed through without being recorded
+            return response
+        return self._record(kind, key, params, response)
+
+    def _record(self, kind, key, params, response):
+        """Store a live response and hand it back to the caller."""
+        def store(recorded, bodies=()):
+            store_entry(key, kind, params, recorded, bodies, self._cache_dir, self._max_bytes)
+
+        if kind == "chat":
+            if params.get("stream"):
+                return _RecordingStream(response, store)
+            choice = response.choices[0]
+            store({"content": choice.message.content, "finish_reason": choice.finish_reason,
+                   "usage": _usage_dict(response.usage), "complete": True})
+        elif kind == "speech":
+            speech_key = _speech_cache_key(params)
+            if speech_key:
+                store_cached_audio(speech_key, data=response.content)
+                _stats.add("records")
+            else:
+                store({}, [response.content])
+        elif kind == "image":
+            # Image URLs expire, so keep the images themselves
+            bodies = [_download(image.url) for image in response.data]
+            store({"data": [{"revised_prompt": image.revised_prompt} for image in response.data],
+                   "created": response.created}, bodies)
+        return response
+
+async def _noop():
+    pass
+
+def cached_client(factory, mode=None, is_async=False):
+    """Wrap an OpenAI client factory in a CachedClient for the configured mode."""
+    return CachedClient(factory, mode=mode, is_async=is_async)
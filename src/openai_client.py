@@ -0,0 +1,81 @@
+"""Process-wide OpenAI clients, created on first use and shared by every stage.
+
+Each client keeps a pool of keep-alive connections, so concurrent TTS, chat and image
+requests reuse TLS sessions instead of handshaking per request. Clients are wrapped
+in the record/replay cache (see openai_cache) and recreated in a forked worker
+process rather than sharing the parent's sockets.
+"""
+import os
+import threading
+from openai_cache import cached_client
+
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "120"))  # Seconds per request
+OPENAI_CONNECT_TIMEOUT = 10.0
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))  # SDK retries with backoff on 429/5xx
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "32"))
+OPENAI_MAX_KEEPALIVE = 16
+OPENAI_KEEPALIVE_EXPIRY = 60.0  # Seconds an idle connection is kept open
+
+_clients = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+def _http_options():
+    import httpx
+    return {
+        "timeout": httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        "limits": httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+        ),
+    }
+
+def _create_client():
+    import httpx
+    from openai import OpenAI
+    options = _http_options()
+    return OpenAI(
+        http_client=httpx.Client(**options),
+        timeout=options["timeout"],
+        max_retries=OPENAI_MAX_RETRIES,
+    )
+
+def _create_async_client():
+    import httpx
+    from openai import AsyncOpenAI
+    options = _http_options()
+    return AsyncOpenAI(
+        http_client=httpx.AsyncClient(**options),
+        timeout=options["timeout"],
+        max_retries=OPENAI_MAX_RETRIES,
+    )
+
+def get_client(max_retries=None):
+    """Return the shared OpenAI client for this process.
+    Args:
+        max_retries (int, optional): Override the SDK's retry count, e.g. 0 for callers
+            that run their own retry loop. The variant shares the same connection pool.
+    """
+    global _clients_pid
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+
+        if None not in _clients:
+            _clients[None] = cached_client(_create_client)
+        if max_retries not in _clients:
+            base = _clients[None]
+            _clients[max_retries] = cached_client(
+                lambda: base.get_client().with_options(max_retries=max_retries)
+            )
+        return _clients[max_retries]
+
+def get_async_client():
+    """Return a new pooled AsyncOpenAI client.
+
+    An async connection pool is bound to the event loop it was used on, so each batch
+    (one asyncio.run) gets its own client and should close it when done.
+    """
+    return cached_client(_create_async_client, is_async=True)
@@ -1,16 +1,42 @@
 import os
 import time
-from datetime import datetime
+import asyncio
+import argparse
+from datetime import datetime, timedelta
 from pathlib import Path
 import random
-from openai import OpenAI
+from collections import deque
+from text_chunker import iter_sentences
+from openai_client import get_client, get_async_client
+from instrumentation import measure
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI()
+SERMON_MODEL = "gpt-4"
+SERMON_TARGET_WORDS = 1100
+SERMON_MAX_WORDS = 1150  # Streaming generation stops at the first paragraph end past this many words
+SERMON_MIN_WORDS = 1050  # Shorter sermons get a continuation
+
+# Continuations see a bounded context so their prompts don't grow with the sermon
+MAX_CONTINUATION_ROUNDS = 3
+CONTEXT_TAIL_WORDS = 150
+CONTEXT_SUMMARY_WORDS = 120
+TOKENS_PER_WORD = 1.4  # Used to size max_tokens for the words still missing
+
+# USD per million tokens (prompt, completion)
+MODEL_PRICING = {
+    "gpt-4": (30.00, 60.00),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+# Batch generation: sermons in flight at once and the account's per-minute budgets
+BATCH_CONCURRENCY = int(os.getenv("SERMON_CONCURRENCY", "4"))
+BATCH_RPM = int(os.getenv("OPENAI_RPM", "60"))
+BATCH_TPM = int(os.getenv("OPENAI_TPM", "40000"))
+CHARS_PER_TOKEN = 4  # Rough estimate used to reserve TPM budget before a request
 
 # Biblical topics with their key points and scriptures
 BIBLICAL_TOPICS = {
@@ -365,88 +391,271 @@ Remember:
 Format the text as a continuous sermon without section headers or numbers."""
     return prompt
 
-def generate_sermon_with_openai(prompt: str) -> str:
-    """Generate sermon content using OpenAI API."""
-    try:
-        # First attempt to generate the sermon
-        response = client.chat.completions.create(
-            model="gpt-4",
+def _ends_sentence(text):
+    return text.rstrip('"\'”’)]').endswith(('.', '!', '?', '…'))
+
+def _trim_unfinished(text):
+    """Drop an unfinished last sentence (a reply cut off by max_tokens)."""
+    text = text.strip()
+    last_end = max(text.rfind(mark) for mark in ('.', '!', '?', '…'))
+    if last_end == -1 or _ends_sentence(text):
+        return text
+    return text[:last_end + 1]
+
+def _sermon_requests(prompt: str):
+    """Drive the generate-then-continue loop without sending any requests itself.
+
+    Yields keyword arguments for chat.completions.create and expects the reply text to
+    be sent back, so the same loop serves the blocking, streaming and async clients.
+    Callers drop a sentence the reply was cut off in (see _trim_unfinished) first.
+    Continuations see a bounded context (an extractive summary of the sermon so far plus
+    its last CONTEXT_TAIL_WORDS words) rather than the whole text, and at most
+    MAX_CONTINUATION_ROUNDS are requested. Returns the finished sermon.
+    """
+    # First attempt to generate the sermon
+    reply = yield dict(
+        model=SERMON_MODEL,
+        messages=[
+            {
+                "role": "system",
+                "content": "You are channeling the voice and perspective of Jesus Christ speaking to a modern audience. Follow this structure strictly:\n1. Opening (110 words)\n2. Main Teaching (770 words)\n3. Application (110 words)\n4. Single Closing Blessing (110 words)\nDo not repeat the closing or add multiple endings. The sermon must be exactly 1100 words total."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        temperature=0.7,
+        max_tokens=2500,
+        presence_penalty=0.6,  # Penalize topic repetition
+        frequency_penalty=0.8   # Strongly penalize word repetition
+    )
+
+    parts = []
+    summary_points = []  # (opening sentence of a paragraph, its word count)
+    tail = deque(maxlen=CONTEXT_TAIL_WORDS)
+    word_count = 0
+    rounds = 0
+
+    while True:
+        # Each reply is split once; nothing re-reads the text accumulated so far
+        reply = reply.strip()
+        words = reply.split()
+        parts.append(reply)
+        tail.extend(words)
+        word_count += len(words)
+        for paragraph in reply.split("\n\n"):
+            for sentence, _ in iter_sentences(paragraph):
+                summary_points.append((sentence, len(sentence.split())))
+                break
+
+        # If the content is too short, generate more in chunks
+        if word_count >= SERMON_MIN_WORDS or rounds >= MAX_CONTINUATION_ROUNDS:
+            break
+        rounds += 1
+        remaining_words = SERMON_TARGET_WORDS - word_count
+
+        continuation_prompt = f"""Continue this sermon to add approximately {remaining_words} more words.
+        Here's a summary of the sermon so far: "{_summarize(summary_points, CONTEXT_SUMMARY_WORDS)}"
+        Here's the current ending for context: "{' '.join(tail)}"
+
+        Important:
+        - Pick up exactly where the ending leaves off, without repeating or rewriting it
+        - Maintain the same style, tone, and thematic consistency
+        - Ensure natural transitions between ideas
+        - Keep building toward a SINGLE conclusion
+        - Do not add multiple endings or blessings"""
+
+        reply = yield dict(
+            model=SERMON_MODEL,
             messages=[
                 {
                     "role": "system",
-                    "content": "You are channeling the voice and perspective of Jesus Christ speaking to a modern audience. Follow this structure strictly:\n1. Opening (110 words)\n2. Main Teaching (770 words)\n3. Application (110 words)\n4. Single Closing Blessing (110 words)\nDo not repeat the closing or add multiple endings. The sermon must be exactly 1100 words total."
+                    "content": "You are continuing a sermon. Focus on maintaining flow and coherence with the previous content. Do not add multiple endings or repeat the blessing. End with a single, powerful closing blessing."
                 },
                 {
                     "role": "user",
-                    "content": prompt
+                    "content": continuation_prompt
                 }
             ],
             temperature=0.7,
-            max_tokens=2500,
-            presence_penalty=0.6,  # Penalize topic repetition
-            frequency_penalty=0.8   # Strongly penalize word repetition
+            # Only pay for the words still missing, with some slack
+            max_tokens=min(2000, int(remaining_words * TOKENS_PER_WORD) + 100),
+            presence_penalty=0.6,
+            frequency_penalty=0.8
         )
-        
-        content = response.choices[0].message.content
-        word_count = len(content.split())
-        
-        # If the content is too short, generate more in chunks
-        while word_count < 1050:  # Allow for some flexibility
-            remaining_words = 1100 - word_count
-            last_sentences = ' '.join(content.split()[-150:])
-            
-            continuation_prompt = f"""Continue this sermon to add approximately {remaining_words} more words.
-            Here's the current ending for context: "{last_sentences}"
-            
-            Important:
-            - You may modify the last few sentences of the previous content to ensure smooth flow
-            - Maintain the same style, tone, and thematic consistency
-            - Ensure natural transitions between ideas
-            - Keep building toward a SINGLE conclusion
-            - Do not add multiple endings or blessings"""
-            
-            continuation = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are continuing a sermon. Focus on maintaining flow and coherence with the previous content. Do not add multiple endings or repeat the blessing. End with a single, powerful closing blessing."
-                    },
-                    {
-                        "role": "assistant",
-                        "content": content  # Provide full context
-                    },
-                    {
-                        "role": "user",
-                        "content": continuation_prompt
-                    }
-                ],
-                temperature=0.7,
-                max_tokens=2000,
-                presence_penalty=0.6,
-                frequency_penalty=0.8
+        print(f"Continuation {rounds}/{MAX_CONTINUATION_ROUNDS}: sermon has {word_count} words")
+
+    # Final word count check
+    if word_count < SERMON_MIN_WORDS or word_count > SERMON_MAX_WORDS:
+        print(f"Warning: Final sermon length is {word_count} words (target: {SERMON_TARGET_WORDS})")
+
+    return "\n\n".join(parts)
+
+def _summarize(points, max_words):
+    """Extractive summary: the opening sentence of each paragraph, newest first to fit."""
+    kept = []
+    total = 0
+    for sentence, count in reversed(points):
+        if total + count > max_words:
+            break
+        kept.append(sentence)
+        total += count
+    return " ".join(reversed(kept))
+
+def new_usage(model=SERMON_MODEL):
+    """Token and cost tally for one sermon."""
+    return {"model": model, "requests": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            "cost": 0.0, "estimated": False}
+
+def _estimate_prompt_tokens(request):
+    return sum(len(message["content"]) for message in request["messages"]) // CHARS_PER_TOKEN
+
+def record_usage(usage, request, reply, reported=None):
+    """Add one request to a sermon's usage.
+
+    Streams closed before the end never receive the usage chunk; their tokens are
+    estimated from the text length and the tally is flagged as estimated.
+    """
+    if usage is None:
+        return
+    if reported is not None:
+        prompt_tokens, completion_tokens = reported.prompt_tokens, reported.completion_tokens
+    else:
+        prompt_tokens = _estimate_prompt_tokens(request)
+        completion_tokens = len(reply) // CHARS_PER_TOKEN
+        usage["estimated"] = True
+    prompt_price, completion_price = MODEL_PRICING.get(request["model"], (0.0, 0.0))
+    usage["requests"] += 1
+    usage["prompt_tokens"] += prompt_tokens
+    usage["completion_tokens"] += completion_tokens
+    usage["cost"] += (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+def _usage_fields(usage):
+    """A usage tally as instrumentation event fields."""
+    return {key: usage[key] for key in ("prompt_tokens", "completion_tokens", "cost", "estimated")}
+
+def format_usage(usage):
+    approx = "~" if usage["estimated"] else ""
+    return (f"{usage['requests']} requests, {approx}{usage['prompt_tokens']} prompt + "
+            f"{approx}{usage['completion_tokens']} completion tokens, {approx}${usage['cost']:.4f}")
+
+def _stream_text(stream, reported):
+    """Yield the text deltas of a streamed chat completion, keeping its usage and
+    finish_reason in reported."""
+    for chunk in stream:
+        # The final chunk only carries usage and has no choices
+        if getattr(chunk, "usage", None):
+            reported["usage"] = chunk.usage
+        if not chunk.choices:
+            continue
+        if chunk.choices[0].finish_reason:
+            reported["finish_reason"] = chunk.choices[0].finish_reason
+        if chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+def stream_sermon(prompt: str, max_words=SERMON_MAX_WORDS, usage=None):
+    """Generate a sermon as a stream of finished sentences.
+
+    Each sentence is yielded as soon as the whitespace after it arrives, with a
+    trailing space or paragraph break so the pieces join back into the sermon text; the
+    result can be passed straight to audio_utils.text_to_audio. Sermons within the
+    accepted length are passed through whole, closing blessing included; a runaway reply
+    is stopped at the first paragraph end past max_words. Continuations are only
+    requested if the model finishes early.
+    Pass a dict from new_usage() to collect token counts and cost.
+    """
+    requests = _sermon_requests(prompt)
+    request = next(requests)
+    word_count = 0
+    try:
+        while True:
+            reply = ""
+            reported = {}
+            stream = get_client().chat.completions.create(
+                **request, stream=True, stream_options={"include_usage": True}
             )
-            
-            additional_content = continuation.choices[0].message.content
-            last_period = content.rfind('.')
-            if last_period != -1:
-                content = content[:last_period + 1] + "\n\n" + additional_content
-            else:
-                content = content + "\n\n" + additional_content
-                
-            word_count = len(content.split())
-            print(f"Current sermon length: {word_count} words")
-            
-            # Prevent infinite loops
-            if len(content.split()) >= 1050:
-                break
-        
-        # Final word count check
-        final_word_count = len(content.split())
-        if final_word_count < 1050 or final_word_count > 1150:
-            print(f"Warning: Final sermon length is {final_word_count} words (target: 1100)")
-        
-        return content
+            try:
+                for sentence, ends_paragraph in iter_sentences(_stream_text(stream, reported)):
+                    # Only the last sentence can lack closing punctuation. It is kept when the
+                    # model finished normally; if the reply was cut off (max_tokens), whatever
+                    # it was in the middle of is left to the continuation
+                    if not _ends_sentence(sentence) and reported.get("finish_reason") != "stop":
+                        break
+                    piece = sentence + ("\n\n" if ends_paragraph else " ")
+                    reply += piece
+                    word_count += len(sentence.split())
+                    yield piece
+                    if word_count >= max_words and ends_paragraph:
+                        break
+            finally:
+                stream.close()
+            record_usage(usage, request, reply, reported.get("usage"))
+            request = requests.send(reply)
+    except StopIteration:
+        return
+
+def generate_sermon_with_openai(prompt: str, usage=None) -> str:
+    """Generate sermon content using OpenAI API."""
+    try:
+        return "".join(stream_sermon(prompt, usage=usage)).strip()
+    except Exception as e:
+        print(f"Error generating sermon: {str(e)}")
+        return None
+
+class RateLimiter:
+    """Token buckets for an API's requests-per-minute and tokens-per-minute limits."""
+
+    def __init__(self, rpm=BATCH_RPM, tpm=BATCH_TPM):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens):
+        """Wait until a request of roughly this many tokens fits within both limits."""
+        tokens = min(tokens, self.tpm)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                wait = max(
+                    (1 - self._requests) * 60 / self.rpm,
+                    (tokens - self._tokens) * 60 / self.tpm,
+                )
+                await asyncio.sleep(max(wait, 0.01))
+
+def estimate_request_tokens(request):
+    """Upper bound on the tokens a completion request counts against the TPM limit."""
+    return _estimate_prompt_tokens(request) + request.get("max_tokens", 0)
+
+async def generate_sermon_async(async_client, prompt: str, limiter: RateLimiter, usage=None) -> str:
+    """Async counterpart of generate_sermon_with_openai, paced by a shared rate limiter."""
+    try:
+        requests = _sermon_requests(prompt)
+        request = next(requests)
+        while True:
+            await limiter.acquire(estimate_request_tokens(request))
+            response = await async_client.chat.completions.create(**request)
+            reply = response.choices[0].message.content
+            record_usage(usage, request, reply, response.usage)
+            if response.choices[0].finish_reason != "stop":
+                reply = _trim_unfinished(reply)
+            request = requests.send(reply)
+    except StopIteration as done:
+        return done.value
     except Exception as e:
         print(f"Error generating sermon: {str(e)}")
         return None
@@ -457,14 +666,22 @@ def ensure_data_directory():
 
 def save_sermon(content: str, topic: str) -> str:
     """Save the generated sermon to a file."""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{timestamp}_{topic.lower().replace(' ', '_')}.txt"
-    
     ensure_data_directory()
-    filepath = os.path.join("data", filename)  # Create path in data directory
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(content)
-    
+    slug = topic.lower().replace(' ', '_')
+    created = datetime.now()
+    while True:
+        timestamp = created.strftime("%Y%m%d_%H%M%S")
+        filepath = os.path.join("data", f"{timestamp}_{slug}.txt")  # Create path in data directory
+        try:
+            # Batch runs can finish two sermons on one topic within the same second; the
+            # later one takes the next free second rather than waiting (this runs on the
+            # batch's event loop)
+            with open(filepath, 'x', encoding='utf-8') as f:
+                f.write(content)
+            break
+        except FileExistsError:
+            created += timedelta(seconds=1)
+
     return str(filepath)  # Return full filepath instead of just filename
 
 def generate_sermon():
@@ -475,7 +692,11 @@ def generate_sermon():
     
     # Create prompt and generate content
     prompt = create_sermon_prompt(topic, topic_data)
-    sermon_content = generate_sermon_with_openai(prompt)
+    usage = new_usage()
+    with measure("sermon", topic=topic) as event:
+        sermon_content = generate_sermon_with_openai(prompt, usage)
+        event.update(_usage_fields(usage), ok=bool(sermon_content))
+    print(f"Sermon usage: {format_usage(usage)}")
     
     if sermon_content:
         # Save the sermon
@@ -483,9 +704,91 @@ def generate_sermon():
         return filename
     return None
 
-def main():
+def pick_topics(count, topics=None):
+    """Spread count sermons across the given topics (all topics by default), in random order."""
+    topics = list(topics or BIBLICAL_TOPICS.keys())
+    unknown = [topic for topic in topics if topic not in BIBLICAL_TOPICS]
+    if unknown:
+        raise ValueError(f"Unknown topics: {', '.join(unknown)}")
+    random.shuffle(topics)
+    return [topics[i % len(topics)] for i in range(count)]
+
+async def generate_sermons_async(count, topics=None, concurrency=BATCH_CONCURRENCY,
+                                 rpm=BATCH_RPM, tpm=BATCH_TPM, on_saved=None):
+    """Generate several sermons concurrently, saving each one as soon as it is finished.
+    Args:
+        count (int): Number of sermons to generate.
+        topics (list, optional): Topic names from BIBLICAL_TOPICS to spread them across.
+        concurrency (int): Sermons generated at the same time.
+        rpm (int), tpm (int): Request and token budgets per minute shared by all sermons.
+        on_saved (callable, optional): Called with each saved file path.
+    Returns:
+        list: Paths of the saved sermons, in completion order.
+    """
+    async_client = get_async_client()
+    limiter = RateLimiter(rpm, tpm)
+    slots = asyncio.Semaphore(concurrency)
+
+    async def generate_one(topic):
+        async with slots:
+            prompt = create_sermon_prompt(topic, BIBLICAL_TOPICS[topic])
+            usage = new_usage()
+            # Wall time only: the CPU of concurrent sermons is shared by one event loop
+            with measure("sermon", topic=topic, batch=True) as event:
+                content = await generate_sermon_async(async_client, prompt, limiter, usage)
+                event.update(_usage_fields(usage), ok=bool(content))
+            return topic, content, usage
+
+    saved = []
+    total_cost = 0.0
+    tasks = [asyncio.ensure_future(generate_one(topic)) for topic in pick_topics(count, topics)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            topic, content, usage = await finished
+            total_cost += usage["cost"]
+            if not content:
+                print(f"❌ Failed to generate sermon on {topic}")
+                continue
+            filename = save_sermon(content, topic)
+            saved.append(filename)
+            print(f"✅ Saved sermon {len(saved)}/{count}: {filename} ({format_usage(usage)})")
+            if on_saved:
+                on_saved(filename)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await async_client.close()
+    print(f"Batch cost: ${total_cost:.4f}")
+    return saved
+
+def generate_sermons(count, topics=None, **kwargs):
+    """Blocking wrapper around generate_sermons_async."""
+    return asyncio.run(generate_sermons_async(count, topics, **kwargs))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate sermons with OpenAI")
+    parser.add_argument("--count", type=int, default=1,
+                        help="Number of sermons to generate (more than one runs concurrently)")
+    parser.add_argument("--topics", nargs="+", choices=list(BIBLICAL_TOPICS.keys()), default=None,
+                        metavar="TOPIC", help="Topics to spread the sermons across (default: all)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY,
+                        help="Sermons generated at the same time")
+    parser.add_argument("--rpm", type=int, default=BATCH_RPM, help="Request budget per minute")
+    parser.add_argument("--tpm", type=int, default=BATCH_TPM, help="Token budget per minute")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Main execution function."""
+    args = parse_args(argv)
     try:
+        if args.count > 1 or args.topics:
+            print(f"Generating {args.count} sermons...")
+            filenames = generate_sermons(
+                args.count, args.topics, concurrency=args.concurrency, rpm=args.rpm, tpm=args.tpm
+            )
+            print(f"Generated {len(filenames)} of {args.count} sermons")
+            return filenames
+
         print("Generating sermon...")
         filename = generate_sermon()
         if filename:
@@ -499,4 +802,4 @@ def main():
         return None
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
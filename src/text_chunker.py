@@ -0,0 +1,86 @@
+"""Sentence-aware text chunking for text-to-speech."""
+import re
+
+# Terminal punctuation, optional closing quotes/brackets, then the whitespace that follows
+_SENTENCE_END = re.compile(r'[.!?…]+["\'”’)\]]*(\s+)')
+
+def iter_sentences(source):
+    """Yield (sentence, ends_paragraph) pairs from a string or a stream of text fragments.
+
+    Fragments may split sentences anywhere (e.g. tokens from a streaming completion);
+    a sentence is only yielded once the whitespace after it has arrived.
+    """
+    if isinstance(source, str):
+        source = [source]
+
+    buffer = ""
+    for fragment in source:
+        buffer += fragment
+        consumed = 0
+        for match in _SENTENCE_END.finditer(buffer):
+            # Whitespace running to the end of the buffer may continue in the next fragment
+            if match.end() == len(buffer):
+                break
+            sentence = buffer[consumed:match.start(1)].strip()
+            if sentence:
+                yield sentence, match.group(1).count("\n") >= 2
+            consumed = match.end()
+        buffer = buffer[consumed:]
+
+    tail = buffer.strip()
+    if tail:
+        yield tail, True
+
+def split_long_sentence(sentence, max_chars):
+    """Split a sentence that exceeds max_chars at word boundaries."""
+    if len(sentence) <= max_chars:
+        return [sentence]
+
+    pieces = []
+    current = ""
+    for word in sentence.split():
+        # A single word longer than the limit has to be cut
+        while len(word) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(word[:max_chars])
+            word = word[max_chars:]
+        if current and len(current) + 1 + len(word) > max_chars:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+def iter_text_chunks(source, max_chars=4000, min_chars=None):
+    """Yield TTS-sized chunks split on sentence and paragraph boundaries.
+
+    Args:
+        source: The text, or an iterable of text fragments that is consumed lazily.
+        max_chars (int): Hard upper bound on chunk length.
+        min_chars (int, optional): A chunk is closed at the first paragraph break once it
+            holds at least this many characters. Defaults to half of max_chars.
+    """
+    if min_chars is None:
+        min_chars = max_chars // 2
+
+    chunk = ""
+    for sentence, ends_paragraph in iter_sentences(source):
+        for piece in split_long_sentence(sentence, max_chars):
+            if chunk and len(chunk) + 1 + len(piece) > max_chars:
+                yield chunk.strip()
+                chunk = ""
+            chunk = f"{chunk} {piece}" if chunk and not chunk.endswith("\n\n") else chunk + piece
+
+        if ends_paragraph:
+            if len(chunk) >= min_chars:
+                yield chunk.strip()
+                chunk = ""
+            elif chunk:
+                chunk += "\n\n"
+
+    if chunk.strip():
+        yield chunk.strip()
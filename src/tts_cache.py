@@ -0,0 +1,75 @@
+"""Content-addressed on-disk cache for synthesized speech chunks."""
+import os
+import json
+import shutil
+import hashlib
+import logging
+from content_store import Counters, entry_path, write_entry, touch_entry, evict_lru
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "cache/tts")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))  # 2 GB
+
+_stats = Counters("hits", "misses", "stores", "evictions")
+
+def tts_cache_key(text, model, voice, speed, instructions):
+    """Hash everything that affects the synthesized audio into a cache key."""
+    payload = json.dumps(
+        {"text": text, "model": model, "voice": voice, "speed": speed, "instructions": instructions},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _entry_path(key, cache_dir):
+    return entry_path(cache_dir, key, ".mp3")
+
+def fetch_cached_audio(key, output_path, cache_dir=TTS_CACHE_DIR):
+    """Copy a cached chunk to output_path. Returns True on a hit."""
+    entry = _entry_path(key, cache_dir)
+    try:
+        shutil.copyfile(entry, output_path)
+        touch_entry(entry)
+    except FileNotFoundError:
+        _stats.add("misses")
+        return False
+    _stats.add("hits")
+    return True
+
+def read_cached_audio(key, cache_dir=TTS_CACHE_DIR):
+    """The cached audio bytes for a key, or None. Not counted in the TTS cache stats."""
+    entry = _entry_path(key, cache_dir)
+    try:
+        with open(entry, "rb") as f:
+            data = f.read()
+        touch_entry(entry)
+    except FileNotFoundError:
+        return None
+    return data
+
+def store_cached_audio(key, source_path=None, cache_dir=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES, data=None):
+    """Add a synthesized chunk (a file, or its bytes as data) to the cache, then evict
+    old entries over the size limit. A chunk that is already cached is only touched."""
+    try:
+        entry = _entry_path(key, cache_dir)
+        if os.path.exists(entry):
+            touch_entry(entry)
+            return
+        write_entry(entry, data=data, source_path=source_path)
+        _stats.add("stores")
+        evict_tts_cache(max_bytes, cache_dir)
+    except Exception as e:
+        logger.warning(f"Could not cache audio chunk: {str(e)}")
+
+def evict_tts_cache(max_bytes=TTS_CACHE_MAX_BYTES, cache_dir=TTS_CACHE_DIR):
+    """Delete least recently used entries until the cache fits in max_bytes."""
+    evicted = evict_lru(cache_dir, max_bytes)
+    if evicted:
+        _stats.add("evictions", evicted)
+        logger.info(f"Evicted {evicted} cached audio chunks")
+    return evicted
+
+def get_tts_cache_stats():
+    """Return a snapshot of the hit/miss/store/eviction counters for this process."""
+    return _stats.snapshot()
@@ -0,0 +1,45 @@
+"""Per-job scratch directories so concurrent jobs never touch each other's files."""
+import os
+import re
+import shutil
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+WORKSPACE_ROOT = "temp"
+
+def _safe_job_dir(job_id):
+    """Turn a job ID into a single, filesystem-safe directory name."""
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', str(job_id)) or "job"
+
+def get_job_workspace(job_id, root=WORKSPACE_ROOT):
+    """Return the scratch directory for a job, creating it if needed.
+
+    The directory is keyed by the job ID, so a rerun of the same sermon lands in
+    the same place while other jobs get their own directories.
+    """
+    path = os.path.join(root, _safe_job_dir(job_id))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def cleanup_job_workspace(job_id, root=WORKSPACE_ROOT):
+    """Remove a job's scratch directory without touching any other job."""
+    path = os.path.join(root, _safe_job_dir(job_id))
+    try:
+        if os.path.exists(path):
+            shutil.rmtree(path)
+            logger.info(f"Cleaned up workspace: {path}")
+    except Exception as e:
+        logger.error(f"Error cleaning up workspace {path}: {str(e)}")
+
+def move_job_workspace(old_job_id, new_job_id, root=WORKSPACE_ROOT):
+    """Hand a scratch directory over to another job ID, replacing that job's directory.
+
+    Returns:
+        str: The new workspace path.
+    """
+    cleanup_job_workspace(new_job_id, root)
+    path = os.path.join(root, _safe_job_dir(new_job_id))
+    os.replace(os.path.join(root, _safe_job_dir(old_job_id)), path)
+    return path
@@ -0,0 +1,43 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import audio_utils
+from audio_utils import synthesize_chunks
+from text_chunker import iter_text_chunks
+
+LATENCY = 0.2  # Seconds per fake TTS request
+
+class FakeSpeech:
+    """A TTS endpoint that takes LATENCY seconds per request and echoes the input text."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+    def create(self, input, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        time.sleep(LATENCY)
+        with self._lock:
+            self.in_flight -= 1
+        return SimpleNamespace(content=input.encode("utf-8"))
+
+def test_chunks_are_synthesized_concurrently_in_order(monkeypatch, tmp_path):
+    speech = FakeSpeech()
+    monkeypatch.setattr(audio_utils, "get_client",
+                        lambda **kwargs: SimpleNamespace(audio=SimpleNamespace(speech=speech)))
+    text = " ".join(f"Sentence number {i} of the sermon." for i in range(12))
+    chunks = list(iter_text_chunks(text, 40))
+    assert len(chunks) >= 8
+
+    started = time.monotonic()
+    paths = synthesize_chunks(text, str(tmp_path), max_in_flight=4, use_cache=False, chunk_size=40)
+    elapsed = time.monotonic() - started
+
+    assert [open(path, encoding="utf-8").read() for path in paths] == chunks
+    assert speech.peak_in_flight == 4
+    # Serially this would take len(chunks) * LATENCY; four at a time about a quarter of that
+    assert elapsed < len(chunks) * LATENCY / 2
@@ -0,0 +1,33 @@
+from job_store import (
+    register_sermon, get_pending_sermons, get_job, mark_running, mark_failed, mark_done, FAILED, INVALID
+)
+
+SERMON = "data/20240101_120000_Grace.txt"
+
+def test_a_job_is_claimed_once(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    register_sermon(SERMON, db_path)
+
+    assert mark_running("20240101_120000_Grace", db_path)
+    # A second run sees the job as running and leaves it alone
+    assert not mark_running("20240101_120000_Grace", db_path)
+    assert get_job("20240101_120000_Grace", db_path)["attempts"] == 1
+
+def test_failed_jobs_are_retried_but_done_jobs_are_not(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    register_sermon(SERMON, db_path)
+    mark_running("20240101_120000_Grace", db_path)
+    mark_failed("20240101_120000_Grace", "render failed", db_path)
+
+    assert get_job("20240101_120000_Grace", db_path)["status"] == FAILED
+    assert mark_running("20240101_120000_Grace", db_path)
+    mark_done("20240101_120000_Grace", "videos/20240101_120000_Grace.mp4", db_path)
+    assert not mark_running("20240101_120000_Grace", db_path)
+
+def test_invalid_sermons_are_not_retried(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    register_sermon("data/badname.txt", db_path)
+    mark_failed("badname", "invalid sermon file", db_path, status=INVALID)
+
+    assert get_pending_sermons(db_path=db_path) == []
+    assert not mark_running("badname", db_path)
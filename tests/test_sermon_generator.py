@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import pytest
+
+import sermon_generator
+from sermon_generator import stream_sermon, SERMON_MAX_WORDS
+
+BLESSING = "The Lord bless you and keep you (Numbers 6:24)"
+
+def paragraph(words, sentence_words=10):
+    """A paragraph of the given length, in sentences of sentence_words words."""
+    sentences = []
+    while words > 0:
+        count = min(sentence_words, words)
+        sentences.append(" ".join(["word"] * (count - 1) + ["word."]))
+        words -= count
+    return " ".join(sentences)
+
+class FakeStream:
+    """A streamed chat completion that delivers text a few characters at a time."""
+
+    def __init__(self, text, finish_reason="stop"):
+        self.text = text
+        self.finish_reason = finish_reason
+        self.closed = False
+
+    def __iter__(self):
+        for start in range(0, len(self.text), 7):
+            delta = SimpleNamespace(content=self.text[start:start + 7])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)], usage=None)
+            if self.closed:
+                return
+        done = SimpleNamespace(delta=SimpleNamespace(content=None), finish_reason=self.finish_reason)
+        yield SimpleNamespace(choices=[done], usage=None)
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def fake_chat(monkeypatch):
+    """Serve queued replies to chat.completions.create and record the requests."""
+    replies = []
+    requests = []
+
+    def create(**request):
+        requests.append(request)
+        return FakeStream(*replies.pop(0))
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(sermon_generator, "get_client", lambda: client)
+    return replies, requests
+
+def test_keeps_final_sentence_without_punctuation(fake_chat):
+    replies, requests = fake_chat
+    text = paragraph(1050) + "\n\n" + BLESSING
+    replies.append((text, "stop"))
+
+    sermon = "".join(stream_sermon("prompt")).strip()
+
+    assert sermon.endswith(BLESSING)
+    assert len(requests) == 1
+
+def test_drops_unfinished_sentence_when_cut_off(fake_chat):
+    replies, requests = fake_chat
+    replies.append((paragraph(600) + " And then the", "length"))
+    replies.append((paragraph(500), "stop"))
+
+    sermon = "".join(stream_sermon("prompt")).strip()
+
+    assert "And then the" not in sermon
+    assert len(requests) == 2
+
+def test_long_sermon_keeps_closing_paragraph(fake_chat):
+    replies, requests = fake_chat
+    # The blessing paragraph runs past the 1100-word target
+    text = "\n\n".join([paragraph(1080), paragraph(50) + " " + BLESSING + "."])
+    replies.append((text, "stop"))
+
+    sermon = "".join(stream_sermon("prompt")).strip()
+
+    assert sermon.endswith(BLESSING + ".")
+    assert len(sermon.split()) > 1100
+    assert len(requests) == 1
+
+def test_runaway_sermon_stops_at_a_paragraph_end(fake_chat):
+    replies, _ = fake_chat
+    text = "\n\n".join([paragraph(1000), paragraph(200), paragraph(400)])
+    replies.append((text, "stop"))
+
+    sermon = "".join(stream_sermon("prompt")).strip()
+
+    assert len(sermon.split()) == 1200
+    assert len(sermon.split()) >= SERMON_MAX_WORDS